@@ -0,0 +1,78 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any, List, Optional, Tuple
+    from tokens import Token
+
+
+class OpCode(IntEnum):
+    # constants and stack manipulation
+    CONSTANT = 0
+    POP      = 1
+
+    # variables
+    GET_LOCAL     = 2
+    SET_LOCAL     = 3
+    GET_UPVALUE   = 4
+    SET_UPVALUE   = 5
+    GET_GLOBAL    = 6
+    SET_GLOBAL    = 7
+    DEFINE_GLOBAL = 8
+
+    # properties
+    GET_PROPERTY = 9
+    SET_PROPERTY = 10
+    GET_SUPER    = 11
+
+    # operators
+    EQUAL         = 12
+    NOT_EQUAL     = 13
+    GREATER       = 14
+    GREATER_EQUAL = 15
+    LESS          = 16
+    LESS_EQUAL    = 17
+    ADD           = 18
+    SUBTRACT      = 19
+    MULTIPLY      = 20
+    DIVIDE        = 21
+    NOT           = 22
+    NEGATE        = 23
+
+    # control flow
+    JUMP          = 24
+    JUMP_IF_FALSE = 25
+    JUMP_IF_TRUE  = 26
+
+    # functions and classes
+    CALL          = 27
+    CLOSURE       = 28
+    CLOSE_UPVALUE = 29
+    RETURN        = 30
+    CLASS         = 31
+    SUBCLASS      = 32
+    METHOD        = 33
+
+    # superinstructions, fused from sequences the compiler emits often
+    POP_JUMP_IF_FALSE = 34
+    SET_LOCAL_POP     = 35
+
+
+@dataclass(frozen=True, slots=True)
+class Code:
+    name: str
+    arity: int
+    is_initializer: bool
+    # kept as (op, arg) pairs, unpacking one tuple per dispatch is cheaper in CPython
+    # than indexing parallel arrays of opcodes and arguments
+    instructions: List[Tuple[OpCode, Any]]
+    # token responsible for each instruction, used to report runtime errors
+    tokens: List[Optional[Token]]
+    # (is_local, index) for each variable captured by the function
+    upvalues: List[Tuple[bool, int]]
+
+    def __str__(self) -> str:
+        return f'<code {self.name}>'
+
@@ -1,12 +1,11 @@
 from __future__ import annotations
 import abc
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
-from environment import Environment
-from exceptions import Return
+from typing import TYPE_CHECKING, ClassVar
+from environment import Cell, Frame
 
 if TYPE_CHECKING:
-    from typing import List
+    from typing import Callable, Optional, Sequence, Tuple
     from classes import LoxInstance
     from interpreter import Interpreter
     from stmt import Function
@@ -14,21 +13,29 @@ if TYPE_CHECKING:
 
 
 class LoxCallable(abc.ABC):
+    __slots__ = ()
+
     @property
     @abc.abstractmethod
     def arity(self) -> int:
         ...
 
     @abc.abstractmethod
-    def call(self, interpreter: Interpreter, arguments: List[LoxValue]) -> LoxValue:
+    def call(self, interpreter: Interpreter, arguments: Sequence[LoxValue]) -> LoxValue:
         ...
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class LoxFunction(LoxCallable):
+    # frames kept per declaration for later calls, enough for shallow recursion
+    POOLED_FRAMES: ClassVar[int] = 4
+
     declaration: Function
-    closure: Environment
+    upvalues: Tuple[Cell, ...]
     is_initializer: bool
+    receiver: Optional[LoxInstance] = None
+    # shared by every function created from the declaration, None if it can't be compiled
+    profile: Optional[Profile] = None
 
     @property
     def arity(self) -> int:
@@ -37,20 +44,50 @@ class LoxFunction(LoxCallable):
     def __str__(self):
         return f'<fn {self.declaration.name.lexeme}>'
 
-    def call(self, interpreter: Interpreter, arguments: List[LoxValue]) -> LoxValue:
-        env = Environment(self.closure)
-        for idx, (param, arg) in enumerate(zip(self.declaration.parameters, arguments)):
-            env.define(param.lexeme, arg)
-        try:
-            interpreter.execute_block(self.declaration.body, Environment(env))
-        except Return as return_value:
-            if self.is_initializer:
-                return self.closure.get_at(0, 'this')
-            return return_value.value
+    def call(self, interpreter: Interpreter, arguments: Sequence[LoxValue]) -> LoxValue:
+        profile = self.profile
+        if profile is not None:
+            if profile.compiled is not None:
+                return profile.compiled(*arguments)
+            profile.calls += 1
+            if profile.calls == Profile.HOT_CALLS:
+                profile.compiled = interpreter.transpile(self.declaration)
+                if profile.compiled is not None:
+                    return profile.compiled(*arguments)
+        declaration = self.declaration
+        # closures capture cells rather than the frame, so a frame can be reused once its call
+        # returns, every slot after the parameters is written by a declaration before it is read
+        if declaration.frames:
+            frame = declaration.frames.pop()
+            frame.upvalues = self.upvalues
+            values = frame.locals
+            values[0] = self.receiver
+            values[1:len(arguments) + 1] = arguments
+        else:
+            values = [self.receiver, *arguments, *declaration.padding]
+            frame = Frame(values, self.upvalues)
+        for slot in declaration.cells:
+            values[slot] = Cell(values[slot])
+        # break and continue can't leave a function, so the body only completes by returning
+        completion = interpreter.execute_block(declaration.body, frame)
+        if len(declaration.frames) < LoxFunction.POOLED_FRAMES:
+            # a pooled frame must not keep what the call referenced alive
+            values[:] = (None,) * len(values)
+            frame.upvalues = ()
+            declaration.frames.append(frame)
         if self.is_initializer:
-            return self.closure.get_at(0, 'this')
+            return self.receiver
+        if completion is not None:
+            return interpreter.return_value
 
     def bind(self, instance: LoxInstance) -> LoxFunction:
-        env = Environment(self.closure)
-        env.define('this', instance)
-        return LoxFunction(self.declaration, env, self.is_initializer)
+        return LoxFunction(self.declaration, self.upvalues, self.is_initializer, instance)
+
+
+@dataclass(slots=True)
+class Profile:
+    # functions are compiled to Python bytecode once they have been called this many times
+    HOT_CALLS: ClassVar[int] = 50
+
+    calls: int = 0
+    compiled: Optional[Callable[..., LoxValue]] = None
@@ -1,22 +1,25 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 from callable import LoxCallable
 from exceptions import RuntimeException
 
 if TYPE_CHECKING:
-    from typing import Dict, Optional, List
+    from typing import Dict, Optional, Sequence
     from callable import LoxFunction
     from interpreter import Interpreter
     from tokens import Token
     from type import LoxValue
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LoxClass(LoxCallable):
     name: str
     superclass: LoxClass
     methods: Dict[str, LoxFunction]
+    # lookups through the superclass chain, misses included, classes don't
+    # change once they are in use
+    resolved: Dict[str, Optional[LoxFunction]] = field(default_factory=dict, compare=False, repr=False)
 
     @property
     def arity(self) -> int:
@@ -26,7 +29,7 @@ class LoxClass(LoxCallable):
     def __str__(self) -> str:
         return f'<{self.name}>'
 
-    def call(self, interpreter: Interpreter, arguments: List[LoxValue]) -> LoxValue:
+    def call(self, interpreter: Interpreter, arguments: Sequence[LoxValue]) -> LoxValue:
         instance = LoxInstance(self, {})
         initializer = self.find_method('init')
         if initializer is not None:
@@ -34,16 +37,22 @@ class LoxClass(LoxCallable):
         return instance
 
     def find_method(self, name: str) -> Optional[LoxFunction]:
-        if name in self.methods:
-            return self.methods[name]
-        if self.superclass is not None:
-            return self.superclass.find_method(name)
+        if name in self.resolved:
+            return self.resolved[name]
+        method = self.methods.get(name)
+        if method is None and self.superclass is not None:
+            method = self.superclass.find_method(name)
+        self.resolved[name] = method
+        return method
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class LoxInstance:
     klass: LoxClass
     fields: Dict[str, LoxValue]
+    # methods bound to this instance, fields are looked up first so a field
+    # shadowing a method never reaches the cache
+    bound: Dict[str, LoxCallable] = field(default_factory=dict, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f'<{self.klass.name} instance>'
@@ -51,9 +60,12 @@ class LoxInstance:
     def get(self, name: Token) -> LoxValue:
         if name.lexeme in self.fields:
             return self.fields[name.lexeme]
+        if name.lexeme in self.bound:
+            return self.bound[name.lexeme]
         method = self.klass.find_method(name.lexeme)
         if method is not None:
-            return method.bind(self)
+            bound = self.bound[name.lexeme] = method.bind(self)
+            return bound
         raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
 
     def set(self, name: Token, value: LoxValue) -> None:
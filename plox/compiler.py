@@ -0,0 +1,373 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import TYPE_CHECKING
+import expr as ex
+import stmt as st
+from bytecode import Code, OpCode
+from expr import ExprVisitor, Get, Set, This, Super
+from stmt import StmtVisitor, Class
+from tokens import TokenType
+
+if TYPE_CHECKING:
+    from typing import List, Optional, Union
+    from tokens import Token
+
+
+class Compiler(ExprVisitor, StmtVisitor):
+    _BINARY_OPS = {
+        TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+        TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+        TokenType.GREATER: OpCode.GREATER,
+        TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+        TokenType.LESS: OpCode.LESS,
+        TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+        TokenType.MINUS: OpCode.SUBTRACT,
+        TokenType.PLUS: OpCode.ADD,
+        TokenType.SLASH: OpCode.DIVIDE,
+        TokenType.STAR: OpCode.MULTIPLY
+    }
+
+    def __init__(self):
+        self._function: Optional[_FunctionState] = None
+
+    def compile(self, stmts: List[st.Stmt]) -> Code:
+        self._begin_function('<script>', [], _FunctionType.SCRIPT)
+        for stmt in stmts:
+            self._compile(stmt)
+        return self._end_function()
+
+    def visit_assign_expr(self, expr: ex.Assign) -> None:
+        self._compile(expr.value)
+        self._set_variable(expr.name.lexeme, expr.name)
+
+    def visit_binary_expr(self, expr: ex.Binary) -> None:
+        self._compile(expr.left)
+        if expr.operator.type is TokenType.COMMA:
+            self._emit(OpCode.POP)
+            self._compile(expr.right)
+            return
+        self._compile(expr.right)
+        self._emit(Compiler._BINARY_OPS[expr.operator.type], token=expr.operator)
+
+    def visit_call_expr(self, expr: ex.Call) -> None:
+        self._compile(expr.callee)
+        for argument in expr.arguments:
+            self._compile(argument)
+        self._emit(OpCode.CALL, len(expr.arguments), expr.paren)
+
+    def visit_get_expr(self, expr: Get) -> None:
+        self._compile(expr.object)
+        self._emit(OpCode.GET_PROPERTY, expr.name, expr.name)
+
+    def visit_grouping_expr(self, expr: ex.Grouping) -> None:
+        self._compile(expr.expression)
+
+    def visit_literal_expr(self, expr: ex.Literal) -> None:
+        self._emit(OpCode.CONSTANT, expr.value)
+
+    def visit_logical_expr(self, expr: ex.Logical) -> None:
+        self._compile(expr.left)
+        jump = self._emit(OpCode.JUMP_IF_TRUE if expr.operator.type is TokenType.OR else OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self._compile(expr.right)
+        self._patch_jump(jump)
+
+    def visit_set_expr(self, expr: Set) -> None:
+        self._compile(expr.object)
+        self._compile(expr.value)
+        self._emit(OpCode.SET_PROPERTY, expr.name, expr.name)
+
+    def visit_super_expr(self, expr: Super) -> None:
+        self._get_variable('this', expr.keyword)
+        self._get_variable('super', expr.keyword)
+        self._emit(OpCode.GET_SUPER, expr.method, expr.method)
+
+    def visit_ternary_expr(self, expr: ex.Ternary) -> None:
+        self._compile(expr.left)
+        else_jump = self._emit(OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self._compile(expr.center)
+        end_jump = self._emit(OpCode.JUMP)
+        self._patch_jump(else_jump)
+        self._emit(OpCode.POP)
+        self._compile(expr.right)
+        self._patch_jump(end_jump)
+
+    def visit_this_expr(self, expr: This) -> None:
+        self._get_variable('this', expr.keyword)
+
+    def visit_unary_expr(self, expr: ex.Unary) -> None:
+        self._compile(expr.right)
+        if expr.op.type is TokenType.MINUS:
+            self._emit(OpCode.NEGATE, token=expr.op)
+        else:
+            self._emit(OpCode.NOT)
+
+    def visit_variable_expr(self, expr: ex.Variable) -> None:
+        self._get_variable(expr.name.lexeme, expr.name)
+
+    def visit_block_stmt(self, stmt: st.Block) -> None:
+        self._begin_scope()
+        for statement in stmt.statements:
+            self._compile(statement)
+        self._end_scope()
+
+    def visit_break_stmt(self, stmt: st.Break) -> None:
+        loop = self._function.loops[-1]
+        self._discard_locals(loop.scope_depth)
+        loop.breaks.append(self._emit(OpCode.JUMP))
+
+    def visit_class_stmt(self, stmt: Class) -> None:
+        if stmt.superclass is not None:
+            self._get_variable(stmt.superclass.name.lexeme, stmt.superclass.name)
+            self._emit(OpCode.SUBCLASS, stmt.name.lexeme, stmt.superclass.name)
+        else:
+            self._emit(OpCode.CLASS, stmt.name.lexeme)
+        self._define_variable(stmt.name)
+        if stmt.superclass is not None:
+            self._begin_scope()
+            self._get_variable(stmt.superclass.name.lexeme, stmt.superclass.name)
+            self._function.locals.append(_Local('super', self._function.scope_depth))
+        self._get_variable(stmt.name.lexeme, stmt.name)
+        for method in stmt.methods:
+            function_type = _FunctionType.METHOD
+            if method.name.lexeme == 'init':
+                function_type = _FunctionType.INITIALIZER
+            self._function_body(method, function_type)
+            self._emit(OpCode.METHOD, method.name.lexeme)
+        self._emit(OpCode.POP)
+        if stmt.superclass is not None:
+            self._end_scope()
+
+    def visit_continue_stmt(self, stmt: st.Continue) -> None:
+        loop = self._function.loops[-1]
+        self._discard_locals(loop.scope_depth)
+        self._emit(OpCode.JUMP, loop.start)
+
+    def visit_expression_stmt(self, stmt: st.Expression) -> None:
+        self._compile(stmt.expression)
+        instructions = self._function.code.instructions
+        # nothing jumps past the store an assignment ends with, so it can drop the value itself
+        if isinstance(stmt.expression, ex.Assign) and instructions[-1][0] is OpCode.SET_LOCAL:
+            instructions[-1] = (OpCode.SET_LOCAL_POP, instructions[-1][1])
+        else:
+            self._emit(OpCode.POP)
+
+    def visit_function_stmt(self, stmt: st.Function) -> None:
+        if self._function.scope_depth > 0:
+            # initialized straight away so the function can refer to itself
+            self._function.locals.append(_Local(stmt.name.lexeme, self._function.scope_depth))
+            self._function_body(stmt, _FunctionType.FUNCTION)
+        else:
+            self._function_body(stmt, _FunctionType.FUNCTION)
+            self._emit(OpCode.DEFINE_GLOBAL, stmt.name.lexeme)
+
+    def visit_if_stmt(self, stmt: st.If) -> None:
+        self._compile(stmt.condition)
+        else_jump = self._emit(OpCode.POP_JUMP_IF_FALSE)
+        self._compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            self._patch_jump(else_jump)
+            return
+        end_jump = self._emit(OpCode.JUMP)
+        self._patch_jump(else_jump)
+        self._compile(stmt.else_branch)
+        self._patch_jump(end_jump)
+
+    def visit_return_stmt(self, stmt: st.Return) -> None:
+        if stmt.value is None:
+            self._emit_default_return_value()
+        else:
+            self._compile(stmt.value)
+        self._emit(OpCode.RETURN)
+
+    def visit_var_stmt(self, stmt: st.Var) -> None:
+        is_local = self._function.scope_depth > 0
+        if is_local:
+            # declared but uninitialized while its initializer is compiled
+            self._function.locals.append(_Local(stmt.name.lexeme, -1))
+        if stmt.initializer is None:
+            self._emit(OpCode.CONSTANT, None)
+        else:
+            self._compile(stmt.initializer)
+        if is_local:
+            self._function.locals[-1].depth = self._function.scope_depth
+        else:
+            self._emit(OpCode.DEFINE_GLOBAL, stmt.name.lexeme)
+
+    def visit_while_stmt(self, stmt: st.While) -> None:
+        loop = _Loop(len(self._function.code.instructions), self._function.scope_depth)
+        self._function.loops.append(loop)
+        self._compile(stmt.condition)
+        exit_jump = self._emit(OpCode.POP_JUMP_IF_FALSE)
+        self._compile(stmt.body)
+        if stmt.increment is not None:
+            self._compile(stmt.increment)
+            self._emit(OpCode.POP)
+        self._emit(OpCode.JUMP, loop.start)
+        self._patch_jump(exit_jump)
+        for jump in loop.breaks:
+            self._patch_jump(jump)
+        self._function.loops.pop()
+
+    def _compile(self, node: Union[ex.Expr, st.Stmt]) -> None:
+        node.accept(self)
+
+    def _emit(self, op: OpCode, arg: object = None, token: Optional[Token] = None) -> int:
+        code = self._function.code
+        code.instructions.append((op, arg))
+        code.tokens.append(token)
+        return len(code.instructions) - 1
+
+    def _patch_jump(self, pc: int) -> None:
+        instructions = self._function.code.instructions
+        instructions[pc] = (instructions[pc][0], len(instructions))
+
+    def _emit_default_return_value(self) -> None:
+        if self._function.function_type is _FunctionType.INITIALIZER:
+            self._emit(OpCode.GET_LOCAL, 0)
+        else:
+            self._emit(OpCode.CONSTANT, None)
+
+    def _begin_function(self, name: str, parameters: List[Token], function_type: _FunctionType) -> None:
+        code = Code(name, len(parameters), function_type is _FunctionType.INITIALIZER, [], [], [])
+        # slot zero holds the receiver of a method call
+        receiver = 'this' if function_type in _BOUND else ''
+        self._function = _FunctionState(self._function, code, function_type, [_Local(receiver, 0)])
+        if function_type is not _FunctionType.SCRIPT:
+            self._begin_scope()
+            for param in parameters:
+                self._function.locals.append(_Local(param.lexeme, self._function.scope_depth))
+
+    def _end_function(self) -> Code:
+        self._emit_default_return_value()
+        self._emit(OpCode.RETURN)
+        code = self._function.code
+        self._function = self._function.enclosing
+        return code
+
+    def _function_body(self, stmt: st.Function, function_type: _FunctionType) -> None:
+        self._begin_function(stmt.name.lexeme, stmt.parameters, function_type)
+        # the body is a scope of its own so it can shadow the parameters
+        self._begin_scope()
+        for statement in stmt.body:
+            self._compile(statement)
+        code = self._end_function()
+        self._emit(OpCode.CLOSURE, code)
+
+    def _begin_scope(self) -> None:
+        self._function.scope_depth += 1
+
+    def _end_scope(self) -> None:
+        function = self._function
+        function.scope_depth -= 1
+        self._discard_locals(function.scope_depth)
+        while function.locals and function.locals[-1].depth > function.scope_depth:
+            function.locals.pop()
+
+    def _discard_locals(self, depth: int) -> None:
+        locals_ = self._function.locals
+        for slot in range(len(locals_) - 1, -1, -1):
+            if locals_[slot].depth <= depth:
+                break
+            if locals_[slot].captured:
+                self._emit(OpCode.CLOSE_UPVALUE, slot)
+            else:
+                self._emit(OpCode.POP)
+
+    def _define_variable(self, name: Token) -> None:
+        if self._function.scope_depth > 0:
+            self._function.locals.append(_Local(name.lexeme, self._function.scope_depth))
+        else:
+            self._emit(OpCode.DEFINE_GLOBAL, name.lexeme)
+
+    def _get_variable(self, name: str, token: Token) -> None:
+        slot = self._resolve_local(self._function, name)
+        if slot is not None:
+            if self._function.locals[slot].depth == -1:
+                # a local read in its own initializer is still nil
+                self._emit(OpCode.CONSTANT, None)
+            else:
+                self._emit(OpCode.GET_LOCAL, slot)
+            return
+        index = self._resolve_upvalue(self._function, name)
+        if index is not None:
+            self._emit(OpCode.GET_UPVALUE, index)
+        else:
+            self._emit(OpCode.GET_GLOBAL, name, token)
+
+    def _set_variable(self, name: str, token: Token) -> None:
+        slot = self._resolve_local(self._function, name)
+        if slot is not None:
+            # assigning a local in its own initializer is overwritten by the initializer
+            if self._function.locals[slot].depth != -1:
+                self._emit(OpCode.SET_LOCAL, slot)
+            return
+        index = self._resolve_upvalue(self._function, name)
+        if index is not None:
+            self._emit(OpCode.SET_UPVALUE, index)
+        else:
+            self._emit(OpCode.SET_GLOBAL, name, token)
+
+    @staticmethod
+    def _resolve_local(function: _FunctionState, name: str) -> Optional[int]:
+        for slot in range(len(function.locals) - 1, -1, -1):
+            if function.locals[slot].name == name:
+                return slot
+        return None
+
+    def _resolve_upvalue(self, function: _FunctionState, name: str) -> Optional[int]:
+        if function.enclosing is None:
+            return None
+        slot = self._resolve_local(function.enclosing, name)
+        if slot is not None:
+            function.enclosing.locals[slot].captured = True
+            return self._add_upvalue(function, True, slot)
+        index = self._resolve_upvalue(function.enclosing, name)
+        if index is not None:
+            return self._add_upvalue(function, False, index)
+        return None
+
+    @staticmethod
+    def _add_upvalue(function: _FunctionState, is_local: bool, index: int) -> int:
+        upvalues = function.code.upvalues
+        if (is_local, index) in upvalues:
+            return upvalues.index((is_local, index))
+        upvalues.append((is_local, index))
+        return len(upvalues) - 1
+
+
+@dataclass
+class _Local:
+    name: str
+    depth: int
+    captured: bool = False
+
+
+@dataclass
+class _Loop:
+    start: int
+    scope_depth: int
+    breaks: List[int] = field(default_factory=list)
+
+
+@dataclass
+class _FunctionState:
+    enclosing: Optional[_FunctionState]
+    code: Code
+    function_type: _FunctionType
+    locals: List[_Local]
+    scope_depth: int = 0
+    loops: List[_Loop] = field(default_factory=list)
+
+
+class _FunctionType(Enum):
+    SCRIPT      = 0
+    FUNCTION    = 1
+    INITIALIZER = 2
+    METHOD      = 3
+
+
+# the functions whose first slot holds the receiver, built once rather than on every function
+_BOUND = frozenset({_FunctionType.METHOD, _FunctionType.INITIALIZER})
@@ -4,25 +4,10 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from tokens import Token
-    from type import LoxValue
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RuntimeException(RuntimeError):
     token: Token
     msg: str
 
-
-@dataclass(frozen=True)
-class Break(RuntimeError):
-    pass
-
-
-@dataclass(frozen=True)
-class Continue(RuntimeError):
-    pass
-
-
-@dataclass(frozen=True)
-class Return(RuntimeError):
-    value: LoxValue
@@ -4,18 +4,25 @@ from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from typing import Any, List
+    from typing import Any, Callable, List, Optional
+    from environment import Storage
     from tokens import Token
-    from type import Literal
+    from type import Literal, LoxValue
 
 
+# nodes are not frozen, the parser builds one for almost every token and the resolver and
+# interpreter annotate them in place, and they are compared by identity
 class Expr(abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
     def accept(self, visitor: ExprVisitor) -> Any:
         ...
 
 
 class ExprVisitor(abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
     def visit_assign_expr(self, expr: Assign) -> Any:
         ...
@@ -69,26 +76,31 @@ class ExprVisitor(abc.ABC):
         ...
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Assign(Expr):
     name: Token
     value: Expr
+    # set by the resolver, globals are left unresolved
+    storage: Optional[Storage] = None
+    slot: Optional[int] = None
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_assign_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Binary(Expr):
     left: Expr
     operator: Token
     right: Expr
+    # replaced by the interpreter with a handler specialized to the operands it sees
+    handler: Optional[Callable[[Binary, LoxValue, LoxValue], LoxValue]] = None
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_binary_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Call(Expr):
     callee: Expr
     paren: Token
@@ -98,7 +110,7 @@ class Call(Expr):
         return visitor.visit_call_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Get(Expr):
     object: Expr
     name: Token
@@ -107,7 +119,7 @@ class Get(Expr):
         return visitor.visit_get_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Grouping(Expr):
     expression: Expr
 
@@ -115,7 +127,7 @@ class Grouping(Expr):
         return visitor.visit_grouping_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Literal(Expr):
     value: Literal
 
@@ -123,7 +135,7 @@ class Literal(Expr):
         return visitor.visit_literal_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Logical(Expr):
     left: Expr
     operator: Token
@@ -133,7 +145,7 @@ class Logical(Expr):
         return visitor.visit_logical_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Set(Expr):
     object: Expr
     name: Token
@@ -143,16 +155,20 @@ class Set(Expr):
         return visitor.visit_set_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Super(Expr):
     keyword: Token
     method: Token
+    this: This
+    # set by the resolver, globals are left unresolved
+    storage: Optional[Storage] = None
+    slot: Optional[int] = None
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_super_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Ternary(Expr):
     left: Expr
     operator1: Token
@@ -164,15 +180,18 @@ class Ternary(Expr):
         return visitor.visit_ternary_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class This(Expr):
     keyword: Token
+    # set by the resolver, globals are left unresolved
+    storage: Optional[Storage] = None
+    slot: Optional[int] = None
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_this_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Unary(Expr):
     op: Token
     right: Expr
@@ -181,9 +200,12 @@ class Unary(Expr):
         return visitor.visit_unary_expr(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Variable(Expr):
     name: Token
+    # set by the resolver, globals are left unresolved
+    storage: Optional[Storage] = None
+    slot: Optional[int] = None
 
     def accept(self, visitor: ExprVisitor) -> Any:
         return visitor.visit_variable_expr(self)
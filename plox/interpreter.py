@@ -1,90 +1,94 @@
 from __future__ import annotations
+import operator
+from enum import Enum
 from typing import TYPE_CHECKING, Any
 import lox
-from environment import Environment
-from exceptions import Break, Continue, Return, RuntimeException
+from environment import Cell, Frame, Storage
+from exceptions import RuntimeException
 import expr as ex
 import natives
 import stmt as st
-from callable import LoxCallable, LoxFunction
+import transpiler
+from callable import LoxCallable, LoxFunction, Profile
 from classes import LoxClass, LoxInstance
 from expr import ExprVisitor, Get, Set, This, Super
+from runtime import check_denominator, check_number_operands, is_equal, is_truthy, stringify
 from stmt import StmtVisitor, Class
 from tokens import TokenType
 
 if TYPE_CHECKING:
-    from typing import List
+    from typing import Callable, Dict, List, Optional, Tuple, Union
     from tokens import Token
     from type import LoxValue
 
 
+# enum attribute lookups are slow, so operators and storage are compared against
+# module level aliases of the members instead
+_LOCAL = Storage.LOCAL
+_CELL = Storage.CELL
+_UPVALUE = Storage.UPVALUE
+
+_BANG = TokenType.BANG
+_COLON = TokenType.COLON
+_MINUS = TokenType.MINUS
+_OR = TokenType.OR
+_QUESTION = TokenType.QUESTION
+
+
+class Completion(Enum):
+    # how a statement that transfers control ended, statements that complete
+    # normally return None
+    BREAK    = 0
+    CONTINUE = 1
+    RETURN   = 2
+
+
 class Interpreter(ExprVisitor, StmtVisitor):
-    def __init__(self):
-        self._GLOBALS = Environment()
-        self._environment = self._GLOBALS
-        self._locals = {}
+    __slots__ = ('_globals', '_frame', 'return_value')
 
-        self._GLOBALS.define('clock', natives.Clock())
-        self._GLOBALS.define('print', natives.Print())
-        self._GLOBALS.define('println', natives.PrintLn())
+    # loops are compiled to Python bytecode once they have run this many iterations
+    HOT_ITERATIONS = 100
+
+    def __init__(self):
+        self._globals: Dict[str, LoxValue] = {
+            'clock': natives.Clock(),
+            'print': natives.Print(),
+            'println': natives.PrintLn()
+        }
+        self._frame = Frame([], ())
+        # set by a return statement before it completes with Completion.RETURN
+        self.return_value: LoxValue = None
 
     def visit_assign_expr(self, expr: ex.Assign) -> LoxValue:
-        value = self._evaluate(expr.value)
-        distance = self._locals.get(expr)
-        if distance is None:
-            self._GLOBALS.assign(expr.name, value)
+        value = expr.value.accept(self)
+        if expr.storage is _LOCAL:
+            self._frame.locals[expr.slot] = value
+        elif expr.storage is _CELL:
+            self._frame.locals[expr.slot].value = value
+        elif expr.storage is _UPVALUE:
+            self._frame.upvalues[expr.slot].value = value
+        elif expr.name.lexeme in self._globals:
+            self._globals[expr.name.lexeme] = value
         else:
-            self._environment.assign_at(distance, expr.name, value)
+            raise RuntimeException(expr.name, f"Undefined variable '{expr.name.lexeme}'")
         return value
 
     def visit_binary_expr(self, expr: ex.Binary) -> LoxValue:
-        left = self._evaluate(expr.left)
-        right = self._evaluate(expr.right)
-
-        if expr.operator.type is TokenType.BANG_EQUAL:
-            return not self._is_equal(left, right)
-        if expr.operator.type is TokenType.EQUAL_EQUAL:
-            return self._is_equal(left, right)
-        if expr.operator.type is TokenType.GREATER:
-            self._check_number_operands(expr.operator, left, right)
-            return left > right
-        if expr.operator.type is TokenType.GREATER_EQUAL:
-            self._check_number_operands(expr.operator, left, right)
-            return left >= right
-        if expr.operator.type is TokenType.LESS:
-            self._check_number_operands(expr.operator, left, right)
-            return left < right
-        if expr.operator.type is TokenType.LESS_EQUAL:
-            self._check_number_operands(expr.operator, left, right)
-            return left <= right
-        if expr.operator.type is TokenType.MINUS:
-            self._check_number_operands(expr.operator, left, right)
-            return left - right
-        if expr.operator.type is TokenType.SLASH:
-            self._check_number_operands(expr.operator, left, right)
-            self._check_denominator(expr.operator, right)
-            return left / right
-        if expr.operator.type is TokenType.STAR:
-            self._check_number_operands(expr.operator, left, right)
-            return left * right
-        if expr.operator.type is TokenType.PLUS:
-            if isinstance(left, float) and isinstance(right, float):
-                return left + right
-            if isinstance(left, str) or isinstance(right, str):
-                return self.stringify(left) + self.stringify(right)
-            raise RuntimeException(expr.operator, 'Incompatible operands.')
-        if expr.operator.type is TokenType.COMMA:
-            self._evaluate(expr.left)
-            return self._evaluate(expr.right)
-
-        # unreachable
-        raise RuntimeError('Unreachable code.')
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if expr.handler is not None:
+            return expr.handler(expr, left, right)
+        return _BINARY_OPS[expr.operator.type](expr, left, right)
 
     def visit_call_expr(self, expr: ex.Call) -> LoxValue:
-        callee = self._evaluate(expr.callee)
-        arguments = []
-        for argument in expr.arguments:
-            arguments.append(self._evaluate(argument))
+        callee = expr.callee.accept(self)
+        # calls rarely have more than one argument, so those don't need a list built for them
+        if len(expr.arguments) == 0:
+            arguments = ()
+        elif len(expr.arguments) == 1:
+            arguments = (expr.arguments[0].accept(self),)
+        else:
+            arguments = tuple([argument.accept(self) for argument in expr.arguments])
         if not isinstance(callee, LoxCallable):
             raise RuntimeException(expr.paren, 'Can only call functions and classes.')
         function = callee
@@ -93,37 +97,40 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return callee.call(self, arguments)
 
     def visit_get_expr(self, expr: Get) -> LoxValue:
-        obj = self._evaluate(expr.object)
+        obj = expr.object.accept(self)
         if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)
+            # fields are looked up here, only methods need the call
+            fields = obj.fields
+            return fields[expr.name.lexeme] if expr.name.lexeme in fields else obj.get(expr.name)
         raise RuntimeException(expr.name, 'Only instances have properties')
 
     def visit_grouping_expr(self, expr: ex.Grouping) -> LoxValue:
-        return self._evaluate(expr.expression)
+        return expr.expression.accept(self)
 
     def visit_literal_expr(self, expr: ex.Literal) -> LoxValue:
         return expr.value
 
     def visit_logical_expr(self, expr: ex.Logical) -> LoxValue:
-        left = self._evaluate(expr.left)
-        if expr.operator.type is TokenType.OR and self._is_truthy(left):
+        left = expr.left.accept(self)
+        # one load of the operator type, and truthiness inlined like in the VM
+        if expr.operator.type is _OR:
+            if left is not None and left is not False:
+                return left
+        elif left is None or left is False:
             return left
-        if expr.operator.type is TokenType.AND and not self._is_truthy(left):
-            return left
-        return self._evaluate(expr.right)
+        return expr.right.accept(self)
 
     def visit_set_expr(self, expr: Set) -> LoxValue:
-        obj = self._evaluate(expr.object)
+        obj = expr.object.accept(self)
         if not isinstance(obj, LoxInstance):
             raise RuntimeException(expr.name, 'Only instances have fields.')
-        value = self._evaluate(expr.value)
-        obj.set(expr.name, value)
+        value = expr.value.accept(self)
+        obj.fields[expr.name.lexeme] = value
         return value
 
     def visit_super_expr(self, expr: Super) -> Any:
-        distance = self._locals[expr]
-        superclass = self._environment.get_at(distance, 'super')
-        obj = self._environment.get_at(distance - 1, 'this')
+        superclass = self._lookup_variable(expr.keyword, expr)
+        obj = self._lookup_variable(expr.keyword, expr.this)
         if not isinstance(superclass, LoxClass):
             # unreachable
             raise RuntimeError('Unreachable code.')
@@ -133,156 +140,268 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return method.bind(obj)
 
     def visit_ternary_expr(self, expr: ex.Ternary) -> LoxValue:
-        if expr.operator1.type is TokenType.QUESTION and expr.operator2.type is TokenType.COLON:
-            pred = self._evaluate(expr.left)
-            if self._is_truthy(pred):
-                return self._evaluate(expr.center)
+        if expr.operator1.type is _QUESTION and expr.operator2.type is _COLON:
+            pred = expr.left.accept(self)
+            if is_truthy(pred):
+                return expr.center.accept(self)
             else:
-                return self._evaluate(expr.right)
+                return expr.right.accept(self)
 
         # unreachable
         raise RuntimeError('Unreachable code.')
 
     def visit_this_expr(self, expr: This) -> Any:
+        # the receiver is in slot 0 unless a closure captured it
+        if expr.storage is _LOCAL:
+            return self._frame.locals[expr.slot]
         return self._lookup_variable(expr.keyword, expr)
 
     def visit_unary_expr(self, expr: ex.Unary) -> LoxValue:
-        right = self._evaluate(expr.right)
-        if expr.op.type is TokenType.MINUS:
-            self._check_number_operands(expr.op, right)
+        right = expr.right.accept(self)
+        if expr.op.type is _MINUS:
+            if type(right) is not float:
+                raise RuntimeException(expr.op, 'Operands must be numbers.')
             return -right
-        if expr.op.type is TokenType.BANG:
-            return not self._is_truthy(right)
+        if expr.op.type is _BANG:
+            return right is None or right is False
 
         # unreachable
         raise RuntimeError('Unreachable code.')
 
     def visit_variable_expr(self, expr: ex.Variable) -> LoxValue:
+        # reading a local is the most common operation, so it skips the call
+        if expr.storage is _LOCAL:
+            return self._frame.locals[expr.slot]
         return self._lookup_variable(expr.name, expr)
 
-    def visit_block_stmt(self, stmt: st.Block) -> None:
-        self.execute_block(stmt.statements, Environment(self._environment))
+    def visit_block_stmt(self, stmt: st.Block) -> Optional[Completion]:
+        for statement in stmt.statements:
+            completion = statement.accept(self)
+            if completion is not None:
+                return completion
 
-    def visit_break_stmt(self, stmt: st.Break) -> None:
-        raise Break()
+    def visit_break_stmt(self, stmt: st.Break) -> Completion:
+        return Completion.BREAK
 
     def visit_class_stmt(self, stmt: Class) -> None:
         superclass = None
         if stmt.superclass is not None:
-            superclass = self._evaluate(stmt.superclass)
+            superclass = stmt.superclass.accept(self)
             if not isinstance(superclass, LoxClass):
                 raise RuntimeException(stmt.superclass.name, 'Superclass must be a class.')
-        self._environment.define(stmt.name.lexeme, None)
-        if stmt.superclass is not None:
-            self._environment = Environment(self._environment)
-            self._environment.define('super', superclass)
+        self._declare(stmt)
+        if superclass is not None:
+            self._frame.locals[stmt.super_slot] = Cell(superclass)
         methods = {}
         for method in stmt.methods:
-            function = LoxFunction(method, self._environment, method.name.lexeme == 'init')
+            function = LoxFunction(method, self._capture(method), method.name.lexeme == 'init')
             methods[method.name.lexeme] = function
         klass = LoxClass(stmt.name.lexeme, superclass, methods)
-        if superclass is not None:
-            self._environment = self._environment.enclosing
-        self._environment.assign(stmt.name, klass)
+        self._initialize(stmt, klass)
 
-    def visit_continue_stmt(self, stmt: st.Continue) -> None:
-        raise Continue()
+    def visit_continue_stmt(self, stmt: st.Continue) -> Completion:
+        return Completion.CONTINUE
 
     def visit_expression_stmt(self, stmt: st.Expression) -> None:
-        self._evaluate(stmt.expression)
+        stmt.expression.accept(self)
 
     def visit_function_stmt(self, stmt: st.Function) -> None:
-        function = LoxFunction(stmt, self._environment, False)
-        self._environment.define(stmt.name.lexeme, function)
-
-    def visit_if_stmt(self, stmt: st.If) -> None:
-        if self._is_truthy(self._evaluate(stmt.condition)):
-            self._execute(stmt.then_branch)
+        self._declare(stmt)
+        function = LoxFunction(stmt, self._capture(stmt), False, None, self._profile(stmt))
+        self._initialize(stmt, function)
+
+    def visit_if_stmt(self, stmt: st.If) -> Optional[Completion]:
+        condition = stmt.condition.accept(self)
+        if condition is not None and condition is not False:
+            return stmt.then_branch.accept(self)
         elif stmt.else_branch:
-            self._execute(stmt.else_branch)
+            return stmt.else_branch.accept(self)
 
-    def visit_return_stmt(self, stmt: st.Return) -> None:
-        raise Return(None if stmt.value is None else self._evaluate(stmt.value))
+    def visit_return_stmt(self, stmt: st.Return) -> Completion:
+        self.return_value = None if stmt.value is None else stmt.value.accept(self)
+        return Completion.RETURN
 
     def visit_var_stmt(self, stmt: st.Var) -> None:
+        self._declare(stmt)
         value = None
         if stmt.initializer is not None:
-            value = self._evaluate(stmt.initializer)
-        self._environment.initialize(stmt.name, value)
-
-    def visit_while_stmt(self, stmt: st.While) -> None:
-        while self._is_truthy(self._evaluate(stmt.condition)):
-            try:
-                self._execute(stmt.body)
-            except Break:
-                break
-            except Continue:
-                continue
+            value = stmt.initializer.accept(self)
+        self._initialize(stmt, value)
+
+    def visit_while_stmt(self, stmt: st.While) -> Optional[Completion]:
+        if stmt.compiled is not None:
+            return stmt.compiled(self._frame.locals, self._frame.upvalues)
+        # the loop runs for as long as the program does, so its lookups are hoisted
+        condition, body, increment = stmt.condition, stmt.body, stmt.increment
+        iterations = stmt.iterations
+        try:
+            while (value := condition.accept(self)) is not None and value is not False:
+                completion = body.accept(self)
+                if completion is None:
+                    if increment is not None:
+                        increment.accept(self)
+                elif completion is Completion.BREAK:
+                    break
+                elif completion is Completion.RETURN:
+                    return completion
+                iterations += 1
+                if iterations == Interpreter.HOT_ITERATIONS:
+                    # hand over at the top of the loop, before the condition is evaluated again
+                    compiled = transpiler.transpile_loop(stmt, self, self._globals)
+                    if compiled is not None:
+                        stmt.compiled = compiled
+                        return compiled(self._frame.locals, self._frame.upvalues)
+        finally:
+            stmt.iterations = iterations
 
     def interpret(self, stmts: List[st.Stmt]) -> None:
         try:
             for stmt in stmts:
-                self._execute(stmt)
+                stmt.accept(self)
         except RuntimeException as e:
             lox.Lox.error_runtime(e)
 
-    def execute_block(self, stmts: List[st.Stmt], env: Environment) -> None:
-        prev = self._environment
+    def execute_block(self, stmts: List[st.Stmt], frame: Frame) -> Optional[Completion]:
+        prev = self._frame
         try:
-            self._environment = env
+            self._frame = frame
             for stmt in stmts:
-                self._execute(stmt)
+                completion = stmt.accept(self)
+                if completion is not None:
+                    return completion
         finally:
-            self._environment = prev
-
-    def resolve(self, expr: ex.Expr, depth: int) -> None:
-        self._locals[expr] = depth
-
-    @staticmethod
-    def stringify(value: LoxValue) -> str:
-        if value is None:
-            return 'nil'
-        if isinstance(value, float):
-            text = str(value)
-            if text.endswith('.0'):
-                text = text[:-2]
-            return text
-        if isinstance(value, bool):
-            return str(value).lower()
-        return str(value)
-
-    def _execute(self, stmt: st.Stmt) -> None:
-        stmt.accept(self)
-
-    def _evaluate(self, expr: ex.Expr) -> LoxValue:
-        return expr.accept(self)
+            self._frame = prev
+
+    def transpile(self, stmt: st.Function) -> Optional[Callable[..., LoxValue]]:
+        return transpiler.transpile(stmt, self, self._globals)
+
+    def reserve(self, slots: int) -> None:
+        # locals declared in blocks at the top level live in the frame of the script
+        self._frame.locals.extend([None] * (slots - len(self._frame.locals)))
+
+    def _declare(self, stmt: Union[st.Class, st.Function, st.Var]) -> None:
+        # a local variable is already in scope in its own initializer, where it is nil,
+        # and a cell has to exist before a closure can capture it
+        if stmt.storage is _LOCAL:
+            self._frame.locals[stmt.slot] = None
+        elif stmt.storage is _CELL:
+            self._frame.locals[stmt.slot] = Cell(None)
+
+    def _initialize(self, stmt: Union[st.Class, st.Function, st.Var], value: LoxValue) -> None:
+        if stmt.storage is _LOCAL:
+            self._frame.locals[stmt.slot] = value
+        elif stmt.storage is _CELL:
+            self._frame.locals[stmt.slot].value = value
+        else:
+            self._globals[stmt.name.lexeme] = value
+
+    def _profile(self, stmt: st.Function) -> Optional[Profile]:
+        # closures are never compiled, so they aren't profiled either
+        if len(stmt.upvalues) > 0 or len(stmt.cells) > 0:
+            return None
+        if stmt.profile is None:
+            stmt.profile = Profile()
+        return stmt.profile
+
+    def _capture(self, function: st.Function) -> Tuple[Cell, ...]:
+        frame = self._frame
+        return tuple(frame.locals[idx] if is_local else frame.upvalues[idx] for is_local, idx in function.upvalues)
 
     def _lookup_variable(self, name: Token, expr: ex.Expr):
-        distance = self._locals.get(expr)
-        if distance is None:
-            return self._GLOBALS.get(name)
-        else:
-            return self._environment.get_at(distance, name.lexeme)
-
-    @staticmethod
-    def _is_truthy(value: LoxValue) -> bool:
-        if value is None:
-            return False
-        if isinstance(value, bool):
-            return value
-        return True
-
-    @staticmethod
-    def _is_equal(a: LoxValue, b: LoxValue) -> bool:
-        return a == b
-
-    @staticmethod
-    def _check_number_operands(operator: Token, *args: LoxValue) -> None:
-        for operand in args:
-            if not isinstance(operand, float):
-                raise RuntimeException(operator, 'Operands must be numbers.')
-
-    @staticmethod
-    def _check_denominator(operator: Token, value: LoxValue) -> None:
-        if value == 0:
-            raise RuntimeException(operator, 'Division by zero.')
+        if expr.storage is _LOCAL:
+            return self._frame.locals[expr.slot]
+        if expr.storage is _CELL:
+            return self._frame.locals[expr.slot].value
+        if expr.storage is _UPVALUE:
+            return self._frame.upvalues[expr.slot].value
+        # globals are almost always defined, so only a miss pays for the exception
+        try:
+            return self._globals[name.lexeme]
+        except KeyError:
+            raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+
+
+def _quicken(expr: ex.Binary, handler: Callable[[ex.Binary, LoxValue, LoxValue], LoxValue]) -> None:
+    expr.handler = handler
+
+
+def _numeric(operation: Callable[[float, float], LoxValue]) -> Callable[[ex.Binary, LoxValue, LoxValue], LoxValue]:
+    def checked(expr: ex.Binary, left: LoxValue, right: LoxValue) -> LoxValue:
+        check_number_operands(expr.operator, left, right)
+        _quicken(expr, numbers)
+        return operation(left, right)
+
+    def numbers(expr: ex.Binary, left: LoxValue, right: LoxValue) -> LoxValue:
+        if type(left) is float and type(right) is float:
+            return operation(left, right)
+        _quicken(expr, checked)
+        return checked(expr, left, right)
+
+    return checked
+
+
+def _bang_equal(expr: ex.Binary, left: LoxValue, right: LoxValue) -> bool:
+    return not is_equal(left, right)
+
+
+def _equal_equal(expr: ex.Binary, left: LoxValue, right: LoxValue) -> bool:
+    return is_equal(left, right)
+
+
+def _slash(expr: ex.Binary, left: LoxValue, right: LoxValue) -> float:
+    check_number_operands(expr.operator, left, right)
+    check_denominator(expr.operator, right)
+    _quicken(expr, _slash_numbers)
+    return left / right
+
+
+def _slash_numbers(expr: ex.Binary, left: LoxValue, right: LoxValue) -> float:
+    if type(left) is float and type(right) is float and right != 0:
+        return left / right
+    _quicken(expr, _slash)
+    return _slash(expr, left, right)
+
+
+def _plus(expr: ex.Binary, left: LoxValue, right: LoxValue) -> LoxValue:
+    if isinstance(left, float) and isinstance(right, float):
+        _quicken(expr, _plus_numbers)
+        return left + right
+    if isinstance(left, str) and isinstance(right, str):
+        _quicken(expr, _plus_strings)
+        return left + right
+    if isinstance(left, str) or isinstance(right, str):
+        return stringify(left) + stringify(right)
+    raise RuntimeException(expr.operator, 'Incompatible operands.')
+
+
+def _plus_numbers(expr: ex.Binary, left: LoxValue, right: LoxValue) -> float:
+    if type(left) is float and type(right) is float:
+        return left + right
+    _quicken(expr, _plus)
+    return _plus(expr, left, right)
+
+
+def _plus_strings(expr: ex.Binary, left: LoxValue, right: LoxValue) -> str:
+    if type(left) is str and type(right) is str:
+        return left + right
+    _quicken(expr, _plus)
+    return _plus(expr, left, right)
+
+
+def _comma(expr: ex.Binary, left: LoxValue, right: LoxValue) -> LoxValue:
+    return right
+
+
+_BINARY_OPS: Dict[TokenType, Callable[[ex.Binary, LoxValue, LoxValue], LoxValue]] = {
+    TokenType.BANG_EQUAL:    _bang_equal,
+    TokenType.EQUAL_EQUAL:   _equal_equal,
+    TokenType.GREATER:       _numeric(operator.gt),
+    TokenType.GREATER_EQUAL: _numeric(operator.ge),
+    TokenType.LESS:          _numeric(operator.lt),
+    TokenType.LESS_EQUAL:    _numeric(operator.le),
+    TokenType.MINUS:         _numeric(operator.sub),
+    TokenType.SLASH:         _slash,
+    TokenType.STAR:          _numeric(operator.mul),
+    TokenType.PLUS:          _plus,
+    TokenType.COMMA:         _comma
+}
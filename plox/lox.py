@@ -1,10 +1,10 @@
 from __future__ import annotations
 import sys
 from typing import TYPE_CHECKING
-import interpreter as interpret
 import parser as parse
 import resolver as resolve
 import scanner as scan
+import vm
 from tokens import TokenType
 
 if TYPE_CHECKING:
@@ -14,14 +14,20 @@ if TYPE_CHECKING:
 
 
 class Lox:
-    interpreter = interpret.Interpreter()
+    interpreter = vm.VM()
     had_error = False
     had_runtime_error = False
 
     @staticmethod
     def main(argv: List[str]) -> None:
+        if len(argv) > 1 and argv[1] == '--ast':
+            # fall back to the tree-walking interpreter, only imported when asked
+            # for since it pulls in the transpiler and the ast module
+            import interpreter as interpret
+            Lox.interpreter = interpret.Interpreter()
+            argv = argv[:1] + argv[2:]
         if len(argv) > 2:
-            print('Usage: plox [script]')
+            print('Usage: plox [--ast] [script]')
             sys.exit(100)
         elif len(argv) == 2:
             Lox.run_file(path=argv[1])
@@ -65,8 +71,6 @@ class Lox:
         resolver = resolve.Resolver(Lox.interpreter)
         resolver.resolve(statements)
 
-        # print(Lox.interpreter._locals)
-
         if Lox.had_error:
             return
 
@@ -78,7 +82,7 @@ class Lox:
 
     @staticmethod
     def error_token(token: Token, msg: str) -> None:
-        if token.type == TokenType.EOF:
+        if token.type is TokenType.EOF:
             Lox._report(token.line, ' at end', msg)
         else:
             Lox._report(token.line, f" at '{token.lexeme}'", msg)
@@ -3,9 +3,10 @@ import sys
 import time
 from typing import TYPE_CHECKING
 import callable as ca
+from runtime import stringify
 
 if TYPE_CHECKING:
-    from typing import List
+    from typing import Sequence
     from interpreter import Interpreter
     from type import LoxValue
 
@@ -20,8 +21,8 @@ class Clock(_Native):
     def arity(self) -> int:
         return 0
 
-    def call(self, interpreter: Interpreter, arguments: List[LoxValue]) -> float:
-        return float(time.time())
+    def call(self, interpreter: Interpreter, arguments: Sequence[LoxValue]) -> float:
+        return time.time()
 
 
 class Print(_Native):
@@ -29,8 +30,8 @@ class Print(_Native):
     def arity(self) -> int:
         return 1
 
-    def call(self, interpreter: Interpreter, arguments: List[LoxValue]) -> None:
-        sys.stdout.write(interpreter.stringify(arguments[0]))
+    def call(self, interpreter: Interpreter, arguments: Sequence[LoxValue]) -> None:
+        sys.stdout.write(stringify(arguments[0]))
 
 
 class PrintLn(_Native):
@@ -38,5 +39,5 @@ class PrintLn(_Native):
     def arity(self) -> int:
         return 1
 
-    def call(self, interpreter: Interpreter, arguments: List[LoxValue]) -> None:
-        sys.stdout.write(interpreter.stringify(arguments[0]) + '\n')
+    def call(self, interpreter: Interpreter, arguments: Sequence[LoxValue]) -> None:
+        sys.stdout.write(stringify(arguments[0]) + '\n')
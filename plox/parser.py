@@ -10,35 +10,84 @@ if TYPE_CHECKING:
     from typing import List, Optional
 
 
+# token types are singletons, so they are compared by identity, and the end
+# of input is checked for on every token
+_EOF = TokenType.EOF
+
+# binding power of each binary operator, the comma operator and the logical
+# ones are parsed by rules of their own
+_EQUALITY = 1
+_COMPARISON = 2
+_TERM = 3
+_FACTOR = 4
+_PRECEDENCE = {
+    TokenType.BANG_EQUAL:    _EQUALITY,
+    TokenType.EQUAL_EQUAL:   _EQUALITY,
+    TokenType.GREATER:       _COMPARISON,
+    TokenType.GREATER_EQUAL: _COMPARISON,
+    TokenType.LESS:          _COMPARISON,
+    TokenType.LESS_EQUAL:    _COMPARISON,
+    TokenType.MINUS:         _TERM,
+    TokenType.PLUS:          _TERM,
+    TokenType.SLASH:         _FACTOR,
+    TokenType.STAR:          _FACTOR
+}
+# operators that can't start an expression, parsed anyway to report them
+_INVALID_UNARY = (frozenset(_PRECEDENCE) | {TokenType.EQUAL}) - {TokenType.MINUS}
+_UNARY = frozenset({TokenType.BANG, TokenType.MINUS})
+_PREFIXES = _UNARY | _INVALID_UNARY
+_LITERAL = frozenset({TokenType.NUMBER, TokenType.STRING})
+# literal nodes are immutable, so every true, false and nil shares one
+_TRUE = ex.Literal(True)
+_KEYWORD_LITERALS = {TokenType.FALSE: ex.Literal(False), TokenType.TRUE: _TRUE, TokenType.NIL: ex.Literal(None)}
+_BLOCK_ENDS = frozenset({TokenType.RIGHT_BRACE, TokenType.EOF})
+_STATEMENT_KEYWORDS = frozenset({
+    TokenType.BREAK,
+    TokenType.CONTINUE,
+    TokenType.FOR,
+    TokenType.IF,
+    TokenType.RETURN,
+    TokenType.WHILE,
+    TokenType.LEFT_BRACE
+})
+# tokens that begin a statement, where the parser resumes after an error
+_STATEMENT_STARTS = frozenset({
+    TokenType.CLASS,
+    TokenType.FUN,
+    TokenType.VAR,
+    TokenType.FOR,
+    TokenType.IF,
+    TokenType.WHILE,
+    TokenType.RETURN
+})
+
+
 class Parser:
     def __init__(self, tokens: List[Token]) -> None:
         self._tokens = tokens
         self._current = 0
 
-    @property
-    def _is_at_end(self) -> bool:
-        return self._peek().type == TokenType.EOF
-
-    @property
-    def _previous(self) -> Token:
-        return self._tokens[self._current - 1]
-
     def parse(self) -> List[st.Stmt]:
         statements = []
-        while not self._is_at_end:
+        tokens = self._tokens
+        while tokens[self._current].type is not _EOF:
             statement = self._declaration()
             if statement is not None:
                 statements.append(statement)
         return statements
 
     def _declaration(self) -> Optional[st.Stmt]:
+        kind = self._tokens[self._current].type
         try:
-            if self._match(TokenType.CLASS):
-                return self._class_declaration()
-            if self._match(TokenType.FUN):
-                return self._function('function')
-            if self._match(TokenType.VAR):
+            if kind is TokenType.VAR:
+                self._current += 1
                 return self._variable_declaration()
+            if kind is TokenType.FUN:
+                self._current += 1
+                return self._function('function')
+            if kind is TokenType.CLASS:
+                self._current += 1
+                return self._class_declaration()
             return self._statement()
         except _ParseError:
             self._synchronize()
@@ -47,11 +96,10 @@ class Parser:
         name = self._consume(TokenType.IDENTIFIER, 'Expect class name.')
         superclass = None
         if self._match(TokenType.LESS):
-            self._consume(TokenType.IDENTIFIER, 'Expect superclass name.')
-            superclass = ex.Variable(self._previous)
+            superclass = ex.Variable(self._consume(TokenType.IDENTIFIER, 'Expect superclass name.'))
         self._consume(TokenType.LEFT_BRACE, "Expect '{' before class body.")
         methods = []
-        while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end:
+        while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end():
             methods.append(self._function('method'))
         self._consume(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
         return st.Class(name, superclass, methods)
@@ -77,30 +125,33 @@ class Parser:
         return st.Function(name, parameters, body)
 
     def _statement(self) -> st.Stmt:
-        if self._match(TokenType.BREAK):
-            return self._break_statement()
-        if self._match(TokenType.CONTINUE):
-            return self._continue_statement()
-        if self._match(TokenType.FOR):
-            return self._for_statement()
-        if self._match(TokenType.IF):
+        # expression statements are the most common and start with none of the keywords
+        kind = self._tokens[self._current].type
+        if kind not in _STATEMENT_KEYWORDS:
+            return self._expression_statement()
+        self._current += 1
+        if kind is TokenType.IF:
             return self._if_statement()
-        if self._match(TokenType.RETURN):
+        if kind is TokenType.RETURN:
             return self._return_statement()
-        if self._match(TokenType.WHILE):
-            return self._while_statement()
-        if self._match(TokenType.LEFT_BRACE):
+        if kind is TokenType.LEFT_BRACE:
             statements = self._block()
             return st.Block(statements)
-        return self._expression_statement()
+        if kind is TokenType.WHILE:
+            return self._while_statement()
+        if kind is TokenType.FOR:
+            return self._for_statement()
+        if kind is TokenType.BREAK:
+            return self._break_statement()
+        return self._continue_statement()
 
     def _break_statement(self) -> st.Break:
-        keyword = self._previous
+        keyword = self._previous()
         self._consume(TokenType.SEMICOLON, "Expect ';' after continue value.")
         return st.Break(keyword)
 
     def _continue_statement(self) -> st.Continue:
-        keyword = self._previous
+        keyword = self._previous()
         self._consume(TokenType.SEMICOLON, "Expect ';' after continue value.")
         return st.Continue(keyword)
 
@@ -120,16 +171,13 @@ class Parser:
         else:
             initializer = self._expression_statement()
 
-        condition = ex.Literal(True) if self._check(TokenType.SEMICOLON) else self._expression()
+        condition = _TRUE if self._check(TokenType.SEMICOLON) else self._expression()
         self._consume(TokenType.SEMICOLON, "Expect ';' after loop condition.")
 
         increment = None if self._check(TokenType.RIGHT_PAREN) else self._expression()
         self._consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
 
-        body = self._statement()
-        if increment is not None:
-            body = st.Block([body, st.Expression(increment)])
-        body = st.While(condition, body)
+        body = st.While(condition, self._statement(), increment)
         if initializer is not None:
             body = st.Block([initializer, body])
 
@@ -144,7 +192,7 @@ class Parser:
         return st.If(condition, then_branch, else_branch)
 
     def _return_statement(self) -> st.Return:
-        keyword = self._previous
+        keyword = self._previous()
         value = None if self._check(TokenType.SEMICOLON) else self._expression()
         self._consume(TokenType.SEMICOLON, "Expect ';' after return value.")
         return st.Return(keyword, value)
@@ -158,8 +206,9 @@ class Parser:
 
     def _block(self) -> List[st.Stmt]:
         statements = []
+        tokens = self._tokens
 
-        while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end:
+        while tokens[self._current].type not in _BLOCK_ENDS:
             statements.append(self._declaration())
 
         self._consume(TokenType.RIGHT_BRACE, "Expect '}' after block.")
@@ -170,207 +219,209 @@ class Parser:
 
     def _sequence(self) -> ex.Expr:
         expr = self._assignment()
-        while self._match(TokenType.COMMA):
-            op = self._previous
+        while (op := self._eat(TokenType.COMMA)) is not None:
             right = self._assignment()
             expr = ex.Binary(expr, op, right)
         return expr
 
     def _assignment(self) -> ex.Expr:
         expr = self._ternary()
-        if self._match(TokenType.EQUAL):
-            equals = self._previous
-            value = self._assignment()
-            if isinstance(expr, ex.Variable):
-                name = expr.name
-                return ex.Assign(name, value)
-            if isinstance(expr, ex.Get):
-                return ex.Set(expr.object, expr.name, value)
-            self._error(equals, 'Invalid assignment target.')
+        equals = self._eat(TokenType.EQUAL)
+        if equals is None:
+            return expr
+        # chained assignments are right associative, the targets are collected in a loop
+        # and the assignments built from the right, so a long chain doesn't nest Python calls
+        targets = []
+        while equals is not None:
+            targets.append((expr, equals))
+            expr = self._ternary()
+            equals = self._eat(TokenType.EQUAL)
+        for target, equals in reversed(targets):
+            if isinstance(target, ex.Variable):
+                expr = ex.Assign(target.name, expr)
+            elif isinstance(target, ex.Get):
+                expr = ex.Set(target.object, target.name, expr)
+            else:
+                self._error(equals, 'Invalid assignment target.')
+                expr = target
         return expr
 
     def _ternary(self) -> ex.Expr:
         expr = self._logical_or()
-        if self._match(TokenType.QUESTION):
-            op1 = self._previous
+        op1 = self._eat(TokenType.QUESTION)
+        if op1 is None:
+            return expr
+        # only the middle operands nest, a chain of else branches is parsed in a loop
+        branches = []
+        while op1 is not None:
             true_expr = self._ternary()
             op2 = self._consume(TokenType.COLON, "Expect ':' following '?'.")
-            false_expr = self._ternary()
-            return ex.Ternary(expr, op1, true_expr, op2, false_expr)
+            branches.append((expr, op1, true_expr, op2))
+            expr = self._logical_or()
+            op1 = self._eat(TokenType.QUESTION)
+        for condition, op1, true_expr, op2 in reversed(branches):
+            expr = ex.Ternary(condition, op1, true_expr, op2, expr)
         return expr
 
     def _logical_or(self) -> ex.Expr:
         expr = self._logical_and()
-        while self._match(TokenType.OR):
-            op = self._previous
+        while (op := self._eat(TokenType.OR)) is not None:
             right = self._logical_and()
             expr = ex.Logical(expr, op, right)
         return expr
 
     def _logical_and(self) -> ex.Expr:
-        expr = self._equality()
-        while self._match(TokenType.OR):
-            op = self._previous
-            right = self._equality()
+        expr = self._binary(_EQUALITY)
+        while (op := self._eat(TokenType.AND)) is not None:
+            right = self._binary(_EQUALITY)
             expr = ex.Logical(expr, op, right)
         return expr
 
-    def _equality(self) -> ex.Expr:
-        expr = self._comparison()
-        while self._match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            op = self._previous
-            right = self._comparison()
-            expr = ex.Binary(expr, op, right)
-        return expr
-
-    def _comparison(self) -> ex.Expr:
-        expr = self._term()
-        while self._match(TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL):
-            op = self._previous
-            right = self._term()
-            expr = ex.Binary(expr, op, right)
-        return expr
-
-    def _term(self) -> ex.Expr:
-        expr = self._factor()
-        while self._match(TokenType.MINUS, TokenType.PLUS):
-            op = self._previous
-            right = self._factor()
-            expr = ex.Binary(expr, op, right)
-        return expr
-
-    def _factor(self) -> ex.Expr:
+    def _binary(self, precedence: int) -> ex.Expr:
+        # precedence climbing, every binary operator is left associative
         expr = self._unary()
-        while self._match(TokenType.SLASH, TokenType.STAR):
-            op = self._previous
-            right = self._unary()
+        while True:
+            op = self._tokens[self._current]
+            op_precedence = _PRECEDENCE.get(op.type, 0)
+            if op_precedence < precedence:
+                return expr
+            self._current += 1
+            right = self._binary(op_precedence + 1)
             expr = ex.Binary(expr, op, right)
-        return expr
 
     def _unary(self) -> ex.Expr:
-        if self._match(TokenType.BANG, TokenType.MINUS):
-            op = self._previous
+        # most operands have no prefix, one look at the current token rules both kinds out
+        op = self._tokens[self._current]
+        if op.type not in _PREFIXES:
+            return self._call()
+        self._current += 1
+        if op.type in _UNARY:
             right = self._unary()
             return ex.Unary(op, right)
-        if self._match(TokenType.EQUAL):
-            op = self._previous
+        if op.type is TokenType.EQUAL:
             self._assignment()
             raise self._error(op, "Nothing to assign to.")
-        if self._match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            op = self._previous
-            self._comparison()
-            raise self._error(op, 'Not a unary operator.')
-        if self._match(
-                TokenType.GREATER,
-                TokenType.GREATER_EQUAL,
-                TokenType.LESS,
-                TokenType.LESS_EQUAL
-        ):
-            op = self._previous
-            self._term()
-            raise self._error(op, 'Not a unary operator.')
-        if self._match(TokenType.PLUS):
-            op = self._previous
-            self._factor()
+        if op.type is TokenType.PLUS:
+            self._binary(_FACTOR)
             raise self._error(op, "Unary '+' expressions are not supported.")
-        if self._match(TokenType.SLASH, TokenType.STAR):
-            op = self._previous
-            self._unary()
-            raise self._error(op, 'Not a unary operator.')
-        return self._call()
+        # the right operand is parsed as if there was a left one
+        self._binary(_PRECEDENCE[op.type] + 1)
+        raise self._error(op, 'Not a unary operator.')
 
-    def _call(self):
+    def _call(self) -> ex.Expr:
         expr = self._primary()
+        tokens = self._tokens
         while True:
-            if self._match(TokenType.LEFT_PAREN):
+            kind = tokens[self._current].type
+            if kind is TokenType.LEFT_PAREN:
+                self._current += 1
                 expr = self._finish_call(expr)
-            elif self._match(TokenType.DOT):
+            elif kind is TokenType.DOT:
+                self._current += 1
                 name = self._consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
                 expr = ex.Get(expr, name)
             else:
-                break
-        return expr
+                return expr
 
     def _primary(self) -> ex.Expr:
-        if self._match(TokenType.FALSE):
-            return ex.Literal(False)
-        if self._match(TokenType.TRUE):
-            return ex.Literal(True)
-        if self._match(TokenType.NIL):
-            return ex.Literal(None)
-        if self._match(TokenType.NUMBER, TokenType.STRING):
-            return ex.Literal(self._previous.literal)
-        if self._match(TokenType.SUPER):
-            keyword = self._previous
-            self._consume(TokenType.DOT, "Expect a '.' after 'super'.")
-            method = self._consume(TokenType.IDENTIFIER, 'Expect superclass method name.')
-            return ex.Super(keyword, method)
-        if self._match(TokenType.THIS):
-            return ex.This(self._previous)
-        if self._match(TokenType.IDENTIFIER):
-            return ex.Variable(self._previous)
-        if self._match(TokenType.LEFT_PAREN):
+        # the current token is read once and consumed by hand, names and numbers first
+        token = self._tokens[self._current]
+        kind = token.type
+        if kind is TokenType.IDENTIFIER:
+            self._current += 1
+            return ex.Variable(token)
+        if kind in _LITERAL:
+            self._current += 1
+            return ex.Literal(token.literal)
+        if kind is TokenType.THIS:
+            self._current += 1
+            return ex.This(token)
+        if kind is TokenType.LEFT_PAREN:
+            self._current += 1
             expr = self._expression()
             self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
-            return ex.Grouping(expr)
-        raise self._error(self._peek(), 'Expect expression.')
-
-    def _match(self, *args: TokenType) -> bool:
-        for token_type in args:
-            if self._check(token_type):
-                self._advance()
-                return True
+            # groupings are only kept where they stop an expression from being an assignment
+            # target, anywhere else they would cost an extra visit for nothing
+            if isinstance(expr, (ex.Variable, ex.Get)):
+                return ex.Grouping(expr)
+            return expr
+        if kind in _KEYWORD_LITERALS:
+            self._current += 1
+            return _KEYWORD_LITERALS[kind]
+        if kind is TokenType.SUPER:
+            self._current += 1
+            self._consume(TokenType.DOT, "Expect a '.' after 'super'.")
+            method = self._consume(TokenType.IDENTIFIER, 'Expect superclass method name.')
+            return ex.Super(token, method, ex.This(token))
+        raise self._error(token, 'Expect expression.')
+
+    # the token type asked for is never EOF, so the end of the tokens needs no separate check
+    def _match(self, token_type: TokenType) -> bool:
+        if self._tokens[self._current].type is token_type:
+            self._current += 1
+            return True
         return False
 
+    def _eat(self, token_type: TokenType) -> Optional[Token]:
+        # matches like _match, but hands back the consumed token
+        token = self._tokens[self._current]
+        if token.type is token_type:
+            self._current += 1
+            return token
+        return None
+
+    # called for every token, so these read the token list directly
     def _check(self, token_type: TokenType) -> bool:
-        if self._is_at_end:
-            return False
-        return self._peek().type == token_type
+        return self._tokens[self._current].type is token_type
 
     def _advance(self) -> Token:
-        if not self._is_at_end:
+        if self._tokens[self._current].type is not _EOF:
             self._current += 1
-        return self._previous
+        return self._tokens[self._current - 1]
+
+    def _is_at_end(self) -> bool:
+        return self._tokens[self._current].type is _EOF
 
     def _peek(self) -> Token:
         return self._tokens[self._current]
 
+    def _previous(self) -> Token:
+        return self._tokens[self._current - 1]
+
     def _consume(self, token_type: TokenType, msg: str) -> Token:
-        if self._check(token_type):
-            return self._advance()
+        # the expected token is almost always there, EOF is never expected
+        token = self._tokens[self._current]
+        if token.type is token_type:
+            self._current += 1
+            return token
 
-        raise self._error(self._peek(), msg)
+        raise self._error(token, msg)
 
     def _synchronize(self) -> None:
+        # skipping is linear in the tokens skipped, each is looked at once and never parsed
         self._advance()
-        while not self._is_at_end:
-            if self._previous.type == TokenType.SEMICOLON:
-                return
-            if self._peek().type in {
-                TokenType.CLASS,
-                TokenType.FUN,
-                TokenType.VAR,
-                TokenType.FOR,
-                TokenType.IF,
-                TokenType.WHILE,
-                TokenType.RETURN
-            }:
-                return
-            self._advance()
+        tokens = self._tokens
+        current = self._current
+        while tokens[current].type is not _EOF:
+            if tokens[current - 1].type is TokenType.SEMICOLON or tokens[current].type in _STATEMENT_STARTS:
+                break
+            current += 1
+        self._current = current
 
     def _finish_call(self, expr: ex.Expr) -> ex.Call:
         arguments = []
         if not self._check(TokenType.RIGHT_PAREN):
             arguments.append(self._expression())
             while self._match(TokenType.COMMA):
-                if len(arguments) >= 255:
-                    self._error(self._peek(), "Can't have more than 255 arguments.")
                 arguments.append(self._expression())
+            # checked once the arguments are parsed, and reported once, at the closing paren
+            if len(arguments) > 255:
+                self._error(self._peek(), "Can't have more than 255 arguments.")
         paren = self._consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
         return ex.Call(expr, paren, arguments)
 
     @staticmethod
-    def _error(token: Token, msg: str):
+    def _error(token: Token, msg: str) -> _ParseError:
         lox.Lox.error_token(token, msg)
         return _ParseError()
 
@@ -1,82 +1,82 @@
 from __future__ import annotations
+from dataclasses import dataclass, field
 from enum import Enum
-from functools import singledispatchmethod
 from typing import TYPE_CHECKING, Any
 import expr as ex
 import lox
 import stmt as st
+from environment import Storage
 from expr import ExprVisitor, Get, Set, This, Super
-from interpreter import Interpreter
 from stmt import StmtVisitor, Function, Class
 
 if TYPE_CHECKING:
-    from typing import List, Union
+    from typing import AbstractSet, Dict, List, Optional, Tuple, Union
+    from interpreter import Interpreter
     from tokens import Token
 
 
 class Resolver(ExprVisitor, StmtVisitor):
     def __init__(self, interpreter: Interpreter):
         self._interpreter = interpreter
-        self._scopes = []
+        self._function = _FunctionScope(None)
         self._loop_depth = 0
         self._current_function = _FunctionType.NONE
         self._current_class = _ClassType.NONE
 
     def visit_assign_expr(self, expr: ex.Assign) -> None:
-        self.resolve(expr.value)
-        self._resolve_local(expr, expr.name)
+        expr.value.accept(self)
+        self._resolve_local(expr, expr.name.lexeme)
 
     def visit_binary_expr(self, expr: ex.Binary) -> None:
-        self.resolve(expr.left)
-        self.resolve(expr.right)
+        expr.left.accept(self)
+        expr.right.accept(self)
 
     def visit_call_expr(self, expr: ex.Call) -> None:
-        self.resolve(expr.callee)
+        expr.callee.accept(self)
         for arg in expr.arguments:
-            self.resolve(arg)
+            arg.accept(self)
 
     def visit_get_expr(self, expr: Get) -> None:
-        self.resolve(expr.object)
+        expr.object.accept(self)
 
     def visit_grouping_expr(self, expr: ex.Grouping) -> None:
-        self.resolve(expr.expression)
+        expr.expression.accept(self)
 
     def visit_literal_expr(self, expr: ex.Literal) -> None:
         pass
 
     def visit_logical_expr(self, expr: ex.Logical) -> None:
-        self.resolve(expr.left)
-        self.resolve(expr.right)
+        expr.left.accept(self)
+        expr.right.accept(self)
 
     def visit_set_expr(self, expr: Set) -> Any:
-        self.resolve(expr.object)
-        self.resolve(expr.value)
+        expr.object.accept(self)
+        expr.value.accept(self)
 
     def visit_super_expr(self, expr: Super) -> Any:
         if self._current_class is _ClassType.NONE:
             lox.Lox.error_token(expr.keyword, "Can't use 'super' outside of a class.")
         elif self._current_class is not _ClassType.SUBCLASS:
             lox.Lox.error_token(expr.keyword, "Can't use 'super' in a class with no superclass.")
-        self._resolve_local(expr, expr.keyword)
+        self._resolve_local(expr, 'super')
+        self._resolve_local(expr.this, 'this')
 
     def visit_ternary_expr(self, expr: ex.Ternary) -> None:
-        self.resolve(expr.left)
-        self.resolve(expr.center)
-        self.resolve(expr.right)
+        expr.left.accept(self)
+        expr.center.accept(self)
+        expr.right.accept(self)
 
     def visit_this_expr(self, expr: This) -> None:
         if self._current_class == _ClassType.NONE:
             lox.Lox.error_token(expr.keyword, "Can't use 'this' outside of a class.")
             return
-        self._resolve_local(expr, expr.keyword)
+        self._resolve_local(expr, 'this')
 
     def visit_unary_expr(self, expr: ex.Unary) -> None:
-        self.resolve(expr.right)
+        expr.right.accept(self)
 
     def visit_variable_expr(self, expr: ex.Variable) -> None:
-        # if len(self._scopes) > 0 and self._scopes[-1].get(expr.name.lexeme) is False:
-        #     lox.Lox.error_token(expr.name, "Can't read local variable in its own initializer.")
-        self._resolve_local(expr, expr.name)
+        self._resolve_local(expr, expr.name.lexeme)
 
     def visit_block_stmt(self, stmt: st.Block) -> None:
         self._begin_scope()
@@ -90,23 +90,18 @@ class Resolver(ExprVisitor, StmtVisitor):
     def visit_class_stmt(self, stmt: Class) -> None:
         enclosing_class = self._current_class
         self._current_class = _ClassType.CLASS
-        self._declare(stmt.name)
-        self._define(stmt.name)
+        self._declare(stmt.name, stmt)
         if stmt.superclass is not None and stmt.name.lexeme == stmt.superclass.name.lexeme:
             lox.Lox.error_token(stmt.superclass.name, "A class can't inherit from itself.")
         if stmt.superclass is not None:
             self._current_class = _ClassType.SUBCLASS
-            self.resolve(stmt.superclass)
+            stmt.superclass.accept(self)
             self._begin_scope()
-            self._scopes[-1]['super'] = True
-        self._begin_scope()
-        self._scopes[-1]['this'] = True
+            # only ever read by the methods, which capture it
+            _annotate(stmt, super_slot=self._add_local('super', True).slot)
         for method in stmt.methods:
-            declaration = _FunctionType.METHOD
-            if method.name.lexeme == 'init':
-                declaration = _FunctionType.INITIALIZER
+            declaration = _FunctionType.INITIALIZER if method.name.lexeme == 'init' else _FunctionType.METHOD
             self._resolve_function(method, declaration)
-        self._end_scope()
         if stmt.superclass is not None:
             self._end_scope()
         self._current_class = enclosing_class
@@ -116,91 +111,138 @@ class Resolver(ExprVisitor, StmtVisitor):
             lox.Lox.error_token(stmt.keyword, "Can't continue from outside of loop.")
 
     def visit_expression_stmt(self, stmt: st.Expression) -> None:
-        self.resolve(stmt.expression)
+        stmt.expression.accept(self)
 
     def visit_function_stmt(self, stmt: Function) -> None:
-        self._declare(stmt.name)
-        self._define(stmt.name)
+        self._declare(stmt.name, stmt)
         self._resolve_function(stmt, _FunctionType.FUNCTION)
 
     def visit_if_stmt(self, stmt: st.If) -> None:
-        self.resolve(stmt.condition)
-        self.resolve(stmt.then_branch)
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
         if stmt.else_branch is not None:
-            self.resolve(stmt.else_branch)
+            stmt.else_branch.accept(self)
 
     def visit_return_stmt(self, stmt: st.Return) -> None:
-        if self._current_function not in {_FunctionType.FUNCTION, _FunctionType.METHOD}:
+        if self._current_function not in _RETURNING:
             lox.Lox.error_token(stmt.keyword, "Can't return from top-level code.")
         if stmt.value is not None:
             if self._current_function is _FunctionType.INITIALIZER:
                 lox.Lox.error_token(stmt.keyword, "Can't return a value from an initializer.")
-            self.resolve(stmt.value)
+            stmt.value.accept(self)
 
     def visit_var_stmt(self, stmt: st.Var) -> None:
-        self._declare(stmt.name)
+        self._declare(stmt.name, stmt)
         if stmt.initializer is not None:
-            self.resolve(stmt.initializer)
-            self._define(stmt.name)
+            stmt.initializer.accept(self)
 
     def visit_while_stmt(self, stmt: st.While) -> None:
         self._loop_depth += 1
-        self.resolve(stmt.condition)
-        self.resolve(stmt.body)
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+        if stmt.increment is not None:
+            stmt.increment.accept(self)
         self._loop_depth -= 1
 
-    @singledispatchmethod
-    def resolve(self, stmts: Union[st.Stmt, ex.Expr, List[st.Stmt]]) -> None:
+    def resolve(self, stmts: List[st.Stmt]) -> None:
         for stmt in stmts:
-            self.resolve(stmt)
-
-    @resolve.register
-    def _(self, stmt: st.Stmt) -> None:
-        stmt.accept(self)
-
-    @resolve.register
-    def _(self, expr: ex.Expr) -> None:
-        expr.accept(self)
+            stmt.accept(self)
 
     def _begin_scope(self) -> None:
-        self._scopes.append({})
+        self._function.scopes.append({})
 
     def _end_scope(self) -> None:
-        self._scopes.pop()
+        # every closure that could capture the variables of the scope has been resolved by now
+        scope = self._function.scopes.pop()
+        for local in scope.values():
+            storage = Storage.CELL if local.captured else Storage.LOCAL
+            for node in local.nodes:
+                _annotate(node, storage=storage, slot=local.slot)
+        self._function.locals -= len(scope)
 
     def _resolve_function(self, func: st.Function, func_type: _FunctionType) -> None:
         enclosing_function = self._current_function
         enclosing_loop_depth = self._loop_depth
         self._current_function = func_type
         self._loop_depth = 0
+        self._function = _FunctionScope(self._function)
         self._begin_scope()
+        # the first slot holds the receiver of methods
+        self._add_local('this' if func_type in _BOUND else '')
         for param in func.parameters:
             self._declare(param)
-            self._define(param)
-        self._begin_scope()
+        # the body shares the scope of the parameters unless it redeclares one of them
+        shadows = len(func.parameters) > 0 and _declares_any(func.body, {param.lexeme for param in func.parameters})
+        if shadows:
+            self._begin_scope()
         self.resolve(func.body)
+        if shadows:
+            self._end_scope()
+        cells = tuple(
+            local.slot
+            for local in self._function.scopes[-1].values()
+            if local.captured and local.slot <= len(func.parameters)
+        )
         self._end_scope()
-        self._end_scope()
+        # the slots after the receiver and the parameters start out nil
+        padding = (None,) * (self._function.slots - 1 - len(func.parameters))
+        _annotate(
+            func, slots=self._function.slots, padding=padding, upvalues=tuple(self._function.upvalues), cells=cells
+        )
+        self._function = self._function.enclosing
         self._current_function = enclosing_function
         self._loop_depth = enclosing_loop_depth
 
-    def _resolve_local(self, expr: ex.Expr, name: Token) -> None:
-        for idx, scope in enumerate(reversed(self._scopes)):
-            if name.lexeme in scope:
-                self._interpreter.resolve(expr, idx)
-                return
-
-    def _declare(self, name: Token) -> None:
-        if len(self._scopes) == 0:
+    def _resolve_local(self, expr: ex.Expr, name: str) -> None:
+        local = self._function.find_local(name)
+        if local is not None:
+            # the storage is only known once the scope ends
+            local.nodes.append(expr)
             return
-        if name.lexeme in self._scopes[-1]:
-            lox.Lox.error_token(name, 'Already variable with this name in this scope.')
-        self._scopes[-1][name.lexeme] = False
-
-    def _define(self, name: Token) -> None:
-        if len(self._scopes) == 0:
+        idx = self._resolve_upvalue(self._function, name)
+        if idx is not None:
+            _annotate(expr, storage=Storage.UPVALUE, slot=idx)
+
+    def _resolve_upvalue(self, function: _FunctionScope, name: str) -> Optional[int]:
+        if function.enclosing is None:
+            return None
+        local = function.enclosing.find_local(name)
+        if local is not None:
+            local.captured = True
+            return function.add_upvalue(True, local.slot)
+        idx = self._resolve_upvalue(function.enclosing, name)
+        if idx is not None:
+            return function.add_upvalue(False, idx)
+        return None
+
+    def _declare(self, name: Token, node: Optional[st.Stmt] = None) -> None:
+        scopes = self._function.scopes
+        if not scopes:
             return
-        self._scopes[-1][name.lexeme] = True
+        if name.lexeme in scopes[-1]:
+            lox.Lox.error_token(name, 'Already variable with this name in this scope.')
+        local = self._add_local(name.lexeme)
+        if node is not None:
+            local.nodes.append(node)
+
+    def _add_local(self, name: str, captured: bool = False) -> _Local:
+        function = self._function
+        # slots are reused once the scope of the variable that held them ends
+        local = _Local(function.locals, captured)
+        function.scopes[-1][name] = local
+        function.locals += 1
+        if function.locals > function.slots:
+            function.slots = function.locals
+            if function.enclosing is None:
+                self._interpreter.reserve(function.slots)
+        return local
+
+
+def _declares_any(stmts: List[st.Stmt], names: AbstractSet[str]) -> bool:
+    for stmt in stmts:
+        if isinstance(stmt, (st.Var, Function, Class)) and stmt.name.lexeme in names:
+            return True
+    return False
 
 
 class _FunctionType(Enum):
@@ -210,7 +252,49 @@ class _FunctionType(Enum):
     METHOD      = 3
 
 
+# built once rather than as a set literal of enum members on every test, the functions
+# a return is allowed in, and those whose first slot holds the receiver
+_RETURNING = frozenset({_FunctionType.FUNCTION, _FunctionType.METHOD})
+_BOUND     = frozenset({_FunctionType.METHOD, _FunctionType.INITIALIZER})
+
+
 class _ClassType(Enum):
     NONE     = 0
     CLASS    = 1
     SUBCLASS = 2
+
+
+@dataclass
+class _Local:
+    slot: int
+    captured: bool = False
+    # the nodes that refer to the variable, and the statement that declares it
+    nodes: List[Union[ex.Expr, st.Stmt]] = field(default_factory=list)
+
+
+@dataclass
+class _FunctionScope:
+    enclosing: Optional[_FunctionScope]
+    scopes: List[Dict[str, _Local]] = field(default_factory=list)
+    upvalues: List[Tuple[bool, int]] = field(default_factory=list)
+    # number of slots in use, and the most that were ever in use at once
+    locals: int = 0
+    slots: int = 0
+
+    def find_local(self, name: str) -> Optional[_Local]:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def add_upvalue(self, is_local: bool, index: int) -> int:
+        upvalue = (is_local, index)
+        if upvalue in self.upvalues:
+            return self.upvalues.index(upvalue)
+        self.upvalues.append(upvalue)
+        return len(self.upvalues) - 1
+
+
+def _annotate(node: Union[ex.Expr, st.Stmt], **fields: Any) -> None:
+    for name, value in fields.items():
+        setattr(node, name, value)
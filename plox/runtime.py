@@ -0,0 +1,48 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from exceptions import RuntimeException
+
+if TYPE_CHECKING:
+    from tokens import Token
+    from type import LoxValue
+
+
+def stringify(value: LoxValue) -> str:
+    # exact type checks, most common first, Lox values are never instances of subclasses
+    kind = type(value)
+    if kind is float:
+        # formatting an int is cheaper than trimming '.0' off a float, zero and large
+        # values are left to str so -0.0 keeps its sign and exponents are kept
+        if value.is_integer() and -1e16 < value < 1e16 and value != 0:
+            return str(int(value))
+        text = str(value)
+        if text.endswith('.0'):
+            text = text[:-2]
+        return text
+    if kind is str:
+        return value
+    if value is None:
+        return 'nil'
+    if kind is bool:
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def is_truthy(value: LoxValue) -> bool:
+    # nil and false are the only falsy values, and both are singletons
+    return value is not None and value is not False
+
+
+def is_equal(a: LoxValue, b: LoxValue) -> bool:
+    return a == b
+
+
+def check_number_operands(operator: Token, *args: LoxValue) -> None:
+    for operand in args:
+        if not isinstance(operand, float):
+            raise RuntimeException(operator, 'Operands must be numbers.')
+
+
+def check_denominator(operator: Token, value: LoxValue) -> None:
+    if value == 0:
+        raise RuntimeException(operator, 'Division by zero.')
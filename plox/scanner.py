@@ -1,5 +1,7 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
+import re
+import sys
 from tokens import Token, TokenType
 import lox
 
@@ -8,6 +10,18 @@ if TYPE_CHECKING:
     from typing import List
 
 
+# runs of ascii name characters and digits, the scanner falls back to str.isalnum
+# and str.isnumeric for any other characters
+_NAME   = re.compile('[A-Za-z0-9]*')
+_DIGITS = re.compile('[0-9]*')
+
+# enum attribute lookups are slow, so the types of the tokens scanned most often
+# are module level aliases of the members
+_IDENTIFIER = TokenType.IDENTIFIER
+_NUMBER     = TokenType.NUMBER
+_STRING     = TokenType.STRING
+
+
 class Scanner:
     _KEYWORDS = {
         'and': TokenType.AND,
@@ -28,21 +42,40 @@ class Scanner:
         'var': TokenType.VAR,
         'while': TokenType.WHILE
     }
+    # characters that are a token on their own, and those that pair up with a following '='
+    _SINGLE = {
+        '(': TokenType.LEFT_PAREN,
+        ')': TokenType.RIGHT_PAREN,
+        '{': TokenType.LEFT_BRACE,
+        '}': TokenType.RIGHT_BRACE,
+        ':': TokenType.COLON,
+        ',': TokenType.COMMA,
+        '.': TokenType.DOT,
+        '-': TokenType.MINUS,
+        '+': TokenType.PLUS,
+        '?': TokenType.QUESTION,
+        ';': TokenType.SEMICOLON,
+        '*': TokenType.STAR
+    }
+    _PAIRS = {
+        '!': (TokenType.BANG_EQUAL, TokenType.BANG),
+        '=': (TokenType.EQUAL_EQUAL, TokenType.EQUAL),
+        '<': (TokenType.LESS_EQUAL, TokenType.LESS),
+        '>': (TokenType.GREATER_EQUAL, TokenType.GREATER)
+    }
 
     def __init__(self, source: str) -> None:
         self._source = source
         self._start = 0
         self._current = 0
         self._line = 1
-        self._tokens = []
+        self._tokens: List[Token] = []
         self._next_id = 0
 
-    @property
-    def _is_at_end(self) -> bool:
-        return self._current >= len(self._source)
-
     def scan(self) -> List[Token]:
-        while not self._is_at_end:
+        # the source does not change, so its length is read once
+        length = len(self._source)
+        while self._current < length:
             # starting a new lexeme
             self._start = self._current
             self._scan_token()
@@ -50,39 +83,19 @@ class Scanner:
         return self._tokens
 
     def _scan_token(self) -> None:
-        c = self._advance()
-        if c == '(':
-            self._add_token(TokenType.LEFT_PAREN)
-        elif c == ')':
-            self._add_token(TokenType.RIGHT_PAREN)
-        elif c == '{':
-            self._add_token(TokenType.LEFT_BRACE)
-        elif c == '}':
-            self._add_token(TokenType.RIGHT_BRACE)
-        elif c == ':':
-            self._add_token(TokenType.COLON)
-        elif c == ',':
-            self._add_token(TokenType.COMMA)
-        elif c == '.':
-            self._add_token(TokenType.DOT)
-        elif c == '-':
-            self._add_token(TokenType.MINUS)
-        elif c == '+':
-            self._add_token(TokenType.PLUS)
-        elif c == '?':
-            self._add_token(TokenType.QUESTION)
-        elif c == ';':
-            self._add_token(TokenType.SEMICOLON)
-        elif c == '*':
-            self._add_token(TokenType.STAR)
-        elif c == '!':
-            self._add_token(TokenType.BANG_EQUAL if self._match('=') else TokenType.BANG)
-        elif c == '=':
-            self._add_token(TokenType.EQUAL_EQUAL if self._match('=') else TokenType.EQUAL)
-        elif c == '<':
-            self._add_token(TokenType.LESS_EQUAL if self._match('=') else TokenType.LESS)
-        elif c == '>':
-            self._add_token(TokenType.GREATER_EQUAL if self._match('=') else TokenType.GREATER)
+        # advance inline, scan only calls this while there are characters left
+        c = self._source[self._current]
+        self._current += 1
+        token_type = Scanner._SINGLE.get(c)
+        if token_type is not None:
+            self._add_token(token_type)
+        elif c in {' ', '\r', '\t'}:
+            pass
+        elif c == '\n':
+            self._line += 1
+        elif c in Scanner._PAIRS:
+            pair, single = Scanner._PAIRS[c]
+            self._add_token(pair if self._match('=') else single)
         elif c == '/':
             if self._match('/'):
                 self._line_comment()
@@ -91,10 +104,6 @@ class Scanner:
                 # self._block_comment()
             else:
                 self._add_token(TokenType.SLASH)
-        elif c in {' ', '\r', '\t'}:
-            pass
-        elif c == '\n':
-            self._line += 1
         elif c.isalpha():
             self._identifier()
         elif c.isnumeric():
@@ -105,53 +114,68 @@ class Scanner:
             lox.Lox.error_line(self._line, f'Unexpected character, {c}.')
 
     def _line_comment(self) -> None:
-        while self._peek() != '\n' and not self._is_at_end:
-            self._advance()
+        # the comment runs up to the next newline, which is left to be scanned
+        end = self._source.find('\n', self._current)
+        self._current = len(self._source) if end == -1 else end
         # self._add_token(TokenType.COMMENT)
 
     def _identifier(self) -> None:
-        while self._peek().isalpha():
-            self._advance()
-        text = self._source[self._start:self._current]
-        token_type = Scanner._KEYWORDS.get(text) or TokenType.IDENTIFIER
-        self._add_token(token_type)
+        source = self._source
+        # names start with a letter, and may go on with letters and digits
+        end = _NAME.match(source, self._current).end()
+        while end < len(source) and source[end].isalnum():
+            end = _NAME.match(source, end + 1).end()
+        self._current = end
+        # names key the globals, fields and methods dicts, interning them lets those
+        # lookups succeed on an identity check, and every keyword shares one string
+        text = sys.intern(source[self._start:end])
+        token_type = Scanner._KEYWORDS.get(text, _IDENTIFIER)
+        self._tokens.append(Token(self._next_id, token_type, text, None, self._line))
+        self._next_id += 1
 
     def _number(self) -> None:
-        while self._peek().isnumeric():
-            self._advance()
+        self._digits()
 
         # decimal part
         if self._peek() == '.' and self._peek_next().isnumeric():
             # consume the .
             self._advance()
 
-            while self._peek().isnumeric():
-                self._advance()
+            self._digits()
 
-        self._add_token(TokenType.NUMBER, float(self._source[self._start:self._current]))
+        self._add_token(_NUMBER, float(self._source[self._start:self._current]))
 
-    def _string(self) -> None:
-        while c := self._peek() != '"' and not self._is_at_end:
-            if c == '\n':
-                self._line += 1
-            self._advance()
+    def _digits(self) -> None:
+        source = self._source
+        end = _DIGITS.match(source, self._current).end()
+        while end < len(source) and source[end].isnumeric():
+            end = _DIGITS.match(source, end + 1).end()
+        self._current = end
 
-        if self._is_at_end:
+    def _string(self) -> None:
+        source = self._source
+        end = source.find('"', self._current)
+        if end == -1:
+            self._line += source.count('\n', self._current)
+            self._current = len(source)
             lox.Lox.error_line(self._line, 'Unterminated string.')
-
-        # closing "
-        self._advance()
+            return
+        # strings may span lines
+        self._line += source.count('\n', self._current, end)
+        # past the closing "
+        self._current = end + 1
 
         # trim surrounding quotes
-        value = self._source[self._start + 1:self._current - 1]
-        self._add_token(TokenType.STRING, value)
+        value = source[self._start + 1:end]
+        self._add_token(_STRING, value)
 
     def _advance(self) -> str:
         self._current += 1
         return self._source[self._current - 1]
 
+    # these run for every character, so they test for the end of the source inline
     def _match(self, expected: str) -> bool:
-        if self._is_at_end:
+        if self._current >= len(self._source):
             return False
         elif self._source[self._current] != expected:
             return False
@@ -160,7 +184,7 @@ class Scanner:
         return True
 
     def _peek(self) -> str:
-        if self._is_at_end:
+        if self._current >= len(self._source):
             return '\0'
         return self._source[self._current]
 
@@ -1,21 +1,30 @@
 from __future__ import annotations
 import abc
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from typing import Any, List, Optional
+    from typing import Any, Callable, List, Optional, Tuple
+    from callable import Profile
+    from environment import Cell, Frame, Storage
     import expr as ex
+    from interpreter import Completion
     from tokens import Token
+    from type import LoxValue
 
 
+# mutable and compared by identity, like expressions
 class Stmt(abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
     def accept(self, visitor: StmtVisitor) -> Any:
         ...
 
 
 class StmtVisitor(abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
     def visit_block_stmt(self, stmt: Block) -> Any:
         ...
@@ -57,7 +66,7 @@ class StmtVisitor(abc.ABC):
         ...
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Block(Stmt):
     statements: List[Stmt]
 
@@ -65,7 +74,7 @@ class Block(Stmt):
         return visitor.visit_block_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Break(Stmt):
     keyword: Token
 
@@ -73,17 +82,21 @@ class Break(Stmt):
         return visitor.visit_break_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Class(Stmt):
     name: Token
     superclass: Optional[ex.Variable]
     methods: List[Function]
+    # set by the resolver, globals are left unresolved
+    storage: Optional[Storage] = None
+    slot: Optional[int] = None
+    super_slot: Optional[int] = None
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_class_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Continue(Stmt):
     keyword: Token
 
@@ -91,7 +104,7 @@ class Continue(Stmt):
         return visitor.visit_continue_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Expression(Stmt):
     expression: ex.Expr
 
@@ -99,17 +112,30 @@ class Expression(Stmt):
         return visitor.visit_expression_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Function(Stmt):
     name: Token
     parameters: List[Token]
     body: List[Stmt]
+    # set by the resolver, globals are left unresolved
+    storage: Optional[Storage] = None
+    slot: Optional[int] = None
+    # size of the frame, the initial values of the slots after its parameters, the
+    # variables it captures as (is_local, index), and the slots of its parameters that need cells
+    slots: int = 0
+    padding: Tuple[None, ...] = ()
+    upvalues: Tuple[Tuple[bool, int], ...] = ()
+    cells: Tuple[int, ...] = ()
+    # frames of calls that have returned, kept for the next call by the interpreter, and
+    # its calls to the declared function
+    frames: List[Frame] = field(default_factory=list)
+    profile: Optional[Profile] = None
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_function_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class If(Stmt):
     condition: ex.Expr
     then_branch: Stmt
@@ -119,7 +145,7 @@ class If(Stmt):
         return visitor.visit_if_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Return(Stmt):
     keyword: Token
     value: ex.Expr
@@ -128,19 +154,27 @@ class Return(Stmt):
         return visitor.visit_return_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Var(Stmt):
     name: Token
     initializer: Optional[ex.Expr]
+    # set by the resolver, globals are left unresolved
+    storage: Optional[Storage] = None
+    slot: Optional[int] = None
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_var_stmt(self)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class While(Stmt):
     condition: ex.Expr
     body: Stmt
+    # run after the body completes normally, the step of a desugared for loop
+    increment: Optional[ex.Expr] = None
+    # iterations run by the interpreter, and the loop compiled once it was hot
+    iterations: int = 0
+    compiled: Optional[Callable[[List[LoxValue], Tuple[Cell, ...]], Optional[Completion]]] = None
 
     def accept(self, visitor: StmtVisitor) -> Any:
         return visitor.visit_while_stmt(self)
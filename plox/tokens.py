@@ -1,5 +1,5 @@
 from __future__ import annotations
-from enum import Enum
+from enum import IntEnum
 from typing import TYPE_CHECKING
 from dataclasses import dataclass
 
@@ -7,64 +7,64 @@ if TYPE_CHECKING:
     from type import Literal
 
 
-class TokenType(Enum):
+class TokenType(IntEnum):
     # single-character tokens
-    LEFT_PAREN  = '('
-    RIGHT_PAREN = ')'
-    LEFT_BRACE  = '{'
-    RIGHT_BRACE = '}'
-    COLON       = ':'
-    COMMA       = ','
-    DOT         = '.'
-    MINUS       = '-'
-    PLUS        = '+'
-    QUESTION    = '?'
-    SEMICOLON   = ';'
-    SLASH       = '/'
-    STAR        = '*'
+    LEFT_PAREN  = 0
+    RIGHT_PAREN = 1
+    LEFT_BRACE  = 2
+    RIGHT_BRACE = 3
+    COLON       = 4
+    COMMA       = 5
+    DOT         = 6
+    MINUS       = 7
+    PLUS        = 8
+    QUESTION    = 9
+    SEMICOLON   = 10
+    SLASH       = 11
+    STAR        = 12
 
     # one-two character tokens
-    BANG          = '!'
-    BANG_EQUAL    = '!='
-    EQUAL         = '='
-    EQUAL_EQUAL   = '=='
-    GREATER       = '>'
-    GREATER_EQUAL = '>='
-    LESS          = '<'
-    LESS_EQUAL    = '<='
+    BANG          = 13
+    BANG_EQUAL    = 14
+    EQUAL         = 15
+    EQUAL_EQUAL   = 16
+    GREATER       = 17
+    GREATER_EQUAL = 18
+    LESS          = 19
+    LESS_EQUAL    = 20
 
     # literals
-    IDENTIFIER = 'IDENTIFIER'
-    STRING     = 'STRING'
-    NUMBER     = 'NUMBER'
+    IDENTIFIER = 21
+    STRING     = 22
+    NUMBER     = 23
 
     # keywords
-    AND      = 'AND'
-    BREAK    = 'BREAK'
-    CONTINUE = 'CONTINUE'
-    CLASS    = 'CLASS'
-    ELSE     = 'ELSE'
-    FALSE    = 'FALSE'
-    FUN      = 'FUN'
-    FOR      = 'FOR'
-    IF       = 'IF'
-    NIL      = 'NIL'
-    OR       = 'OR'
-    RETURN   = 'RETURN'
-    SUPER    = 'SUPER'
-    THIS     = 'THIS'
-    TRUE     = 'TRUE'
-    VAR      = 'VAR'
-    WHILE    = 'WHILE'
+    AND      = 24
+    BREAK    = 25
+    CONTINUE = 26
+    CLASS    = 27
+    ELSE     = 28
+    FALSE    = 29
+    FUN      = 30
+    FOR      = 31
+    IF       = 32
+    NIL      = 33
+    OR       = 34
+    RETURN   = 35
+    SUPER    = 36
+    THIS     = 37
+    TRUE     = 38
+    VAR      = 39
+    WHILE    = 40
 
     # comment
-    COMMENT = 'COMMENT'
+    COMMENT = 41
 
     # eof
-    EOF = 'EOF'
+    EOF = 42
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True, eq=False)
 class Token:
     _id: int
     type: TokenType
@@ -73,7 +73,7 @@ class Token:
     line: int
 
     def __str__(self) -> str:
-        return f'{self.type} {self.lexeme} {self.literal}'
+        return f'{self.type.name} {self.lexeme} {self.literal}'
 
     def __repr__(self) -> str:
-        return f'<Token type:{self.type} lexeme:{self.lexeme} literal:{self.literal}>'
+        return f'<Token type:{self.type.name} lexeme:{self.lexeme} literal:{self.literal}>'
@@ -0,0 +1,416 @@
+from __future__ import annotations
+import ast
+from typing import TYPE_CHECKING
+import expr as ex
+import interpreter as interpret
+from callable import LoxCallable
+from classes import LoxInstance
+from environment import Cell, Storage
+from exceptions import RuntimeException
+from expr import ExprVisitor
+from runtime import stringify
+from stmt import StmtVisitor
+from tokens import TokenType
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+    from classes import LoxClass
+    import stmt as st
+    from tokens import Token
+    from type import LoxValue
+
+
+def transpile(function: st.Function, interpreter: interpret.Interpreter,
+              globals_: Dict[str, LoxValue]) -> Optional[Callable[..., LoxValue]]:
+    # closures and classes are left to the interpreter
+    if len(function.upvalues) > 0 or len(function.cells) > 0:
+        return None
+    try:
+        return Transpiler(interpreter, globals_, False).transpile(function)
+    except _Unsupported:
+        return None
+
+
+def transpile_loop(
+    loop: st.While, interpreter: interpret.Interpreter, globals_: Dict[str, LoxValue]
+) -> Optional[Callable[[List[LoxValue], Tuple[Cell, ...]], Optional[interpret.Completion]]]:
+    try:
+        return Transpiler(interpreter, globals_, True).transpile_loop(loop)
+    except _Unsupported:
+        return None
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    def __init__(self, interpreter: interpret.Interpreter, globals_: Dict[str, LoxValue], in_frame: bool):
+        # a function keeps its variables in Python locals, a loop run on behalf of the
+        # interpreter reads and writes the locals and upvalues of the frame it is in
+        self._in_frame = in_frame
+        self._namespace: Dict[str, Any] = {
+            '_interpreter': interpreter,
+            '_globals':     globals_,
+            '_Cell':        Cell,
+            '_RETURN':      interpret.Completion.RETURN,
+            '_set_item':    _set_item,
+            '_set_value':   _set_value,
+            '_super':       _super,
+            '_call':        _call,
+            '_get_global':  _get_global,
+            '_set_global':  _set_global,
+            '_get':         _get,
+            '_instance':    _instance,
+            '_set':         _set,
+            '_negate':      _negate,
+            '_plus':        _plus,
+            '_minus':       _minus,
+            '_star':        _star,
+            '_slash':       _slash,
+            '_greater':     _greater,
+            '_greater_eq':  _greater_equal,
+            '_less':        _less,
+            '_less_eq':     _less_equal
+        }
+        self._temporaries = 0
+
+    def transpile(self, function: st.Function) -> Callable[..., LoxValue]:
+        name = f'_lox_{function.name.lexeme}'
+        # slot 0 is the receiver, which functions that aren't methods don't have
+        parameters = [ast.arg(_local(slot)) for slot in range(1, len(function.parameters) + 1)]
+        body = self._block(function.body)
+        body.append(ast.Return(ast.Constant(None)))
+        definition = ast.FunctionDef(
+            name=name,
+            args=ast.arguments(posonlyargs=[], args=parameters, kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=body,
+            decorator_list=[]
+        )
+        return self._compile(definition, f'<lox {function.name.lexeme}>')
+
+    def transpile_loop(
+        self, loop: st.While
+    ) -> Callable[[List[LoxValue], Tuple[Cell, ...]], Optional[interpret.Completion]]:
+        definition = ast.FunctionDef(
+            name='_lox_loop',
+            args=ast.arguments(
+                posonlyargs=[], args=[ast.arg('_locals'), ast.arg('_upvalues')], kwonlyargs=[], kw_defaults=[], defaults=[]
+            ),
+            body=self.visit_while_stmt(loop),
+            decorator_list=[]
+        )
+        return self._compile(definition, '<lox loop>')
+
+    def visit_assign_expr(self, expr: ex.Assign) -> ast.expr:
+        value = self._expression(expr.value)
+        if expr.storage is None:
+            name = ast.Constant(expr.name.lexeme)
+            return self._helper('_set_global', self._globals(), name, value, self._token(expr.name))
+        if not self._in_frame:
+            return ast.NamedExpr(self._variable(expr.storage, expr.slot, ast.Store()), value)
+        if expr.storage is Storage.LOCAL:
+            return self._helper('_set_item', ast.Name('_locals', ast.Load()), ast.Constant(expr.slot), value)
+        return self._helper('_set_value', self._cell(expr.storage, expr.slot), value)
+
+    def visit_binary_expr(self, expr: ex.Binary) -> ast.expr:
+        left = self._expression(expr.left)
+        right = self._expression(expr.right)
+        if expr.operator.type is TokenType.EQUAL_EQUAL:
+            return ast.Compare(left, [ast.Eq()], [right])
+        if expr.operator.type is TokenType.BANG_EQUAL:
+            return ast.UnaryOp(ast.Not(), ast.Compare(left, [ast.Eq()], [right]))
+        if expr.operator.type is TokenType.COMMA:
+            return ast.Subscript(ast.Tuple([left, right], ast.Load()), ast.Constant(1), ast.Load())
+        return self._helper(Transpiler._BINARY_HELPERS[expr.operator.type], left, right, self._token(expr.operator))
+
+    def visit_call_expr(self, expr: ex.Call) -> ast.expr:
+        callee = self._expression(expr.callee)
+        arguments = ast.Tuple([self._expression(argument) for argument in expr.arguments], ast.Load())
+        return self._helper('_call', ast.Name('_interpreter', ast.Load()), callee, arguments, self._token(expr.paren))
+
+    def visit_get_expr(self, expr: ex.Get) -> ast.expr:
+        return self._helper('_get', self._expression(expr.object), self._token(expr.name))
+
+    def visit_grouping_expr(self, expr: ex.Grouping) -> ast.expr:
+        return self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: ex.Literal) -> ast.expr:
+        return ast.Constant(expr.value)
+
+    def visit_logical_expr(self, expr: ex.Logical) -> ast.expr:
+        temporary = self._temporary()
+        left = self._truthy(self._expression(expr.left), temporary)
+        right = self._expression(expr.right)
+        value = ast.Name(temporary, ast.Load())
+        if expr.operator.type is TokenType.OR:
+            return ast.IfExp(left, value, right)
+        return ast.IfExp(left, right, value)
+
+    def visit_set_expr(self, expr: ex.Set) -> ast.expr:
+        # the object is checked before the value is evaluated
+        obj = self._helper('_instance', self._expression(expr.object), self._token(expr.name))
+        return self._helper('_set', obj, self._token(expr.name), self._expression(expr.value))
+
+    def visit_super_expr(self, expr: ex.Super) -> ast.expr:
+        superclass = self._variable(expr.storage, expr.slot, ast.Load())
+        obj = self._variable(expr.this.storage, expr.this.slot, ast.Load())
+        return self._helper('_super', superclass, obj, self._token(expr.method))
+
+    def visit_ternary_expr(self, expr: ex.Ternary) -> ast.expr:
+        test = self._truthy(self._expression(expr.left), self._temporary())
+        return ast.IfExp(test, self._expression(expr.center), self._expression(expr.right))
+
+    def visit_this_expr(self, expr: ex.This) -> ast.expr:
+        return self._variable(expr.storage, expr.slot, ast.Load())
+
+    def visit_unary_expr(self, expr: ex.Unary) -> ast.expr:
+        right = self._expression(expr.right)
+        if expr.op.type is TokenType.MINUS:
+            return self._helper('_negate', right, self._token(expr.op))
+        return ast.UnaryOp(ast.Not(), self._truthy(right, self._temporary()))
+
+    def visit_variable_expr(self, expr: ex.Variable) -> ast.expr:
+        if expr.storage is None:
+            name = ast.Constant(expr.name.lexeme)
+            return self._helper('_get_global', self._globals(), name, self._token(expr.name))
+        return self._variable(expr.storage, expr.slot, ast.Load())
+
+    def visit_block_stmt(self, stmt: st.Block) -> List[ast.stmt]:
+        return self._block(stmt.statements)
+
+    def visit_break_stmt(self, stmt: st.Break) -> List[ast.stmt]:
+        return [ast.Break()]
+
+    def visit_class_stmt(self, stmt: st.Class) -> List[ast.stmt]:
+        raise _Unsupported()
+
+    def visit_continue_stmt(self, stmt: st.Continue) -> List[ast.stmt]:
+        return [ast.Continue()]
+
+    def visit_expression_stmt(self, stmt: st.Expression) -> List[ast.stmt]:
+        return self._discard(stmt.expression)
+
+    def visit_function_stmt(self, stmt: st.Function) -> List[ast.stmt]:
+        raise _Unsupported()
+
+    def visit_if_stmt(self, stmt: st.If) -> List[ast.stmt]:
+        test = self._truthy(self._expression(stmt.condition), self._temporary())
+        orelse = [] if stmt.else_branch is None else self._block([stmt.else_branch])
+        return [ast.If(test, self._block([stmt.then_branch]), orelse)]
+
+    def visit_return_stmt(self, stmt: st.Return) -> List[ast.stmt]:
+        value = ast.Constant(None) if stmt.value is None else self._expression(stmt.value)
+        if self._in_frame:
+            # the interpreter is running the function, so it has to be told to return
+            target = ast.Attribute(ast.Name('_interpreter', ast.Load()), 'return_value', ast.Store())
+            return [ast.Assign([target], value), ast.Return(ast.Name('_RETURN', ast.Load()))]
+        return [ast.Return(value)]
+
+    def visit_var_stmt(self, stmt: st.Var) -> List[ast.stmt]:
+        if stmt.storage is None:
+            raise _Unsupported()
+        # a local variable is already in scope in its own initializer, where it is nil
+        stmts: List[ast.stmt] = []
+        if stmt.storage is Storage.CELL and self._in_frame:
+            slot = ast.Subscript(ast.Name('_locals', ast.Load()), ast.Constant(stmt.slot), ast.Store())
+            stmts.append(ast.Assign([slot], self._helper('_Cell', ast.Constant(None))))
+        else:
+            stmts.append(ast.Assign([self._variable(stmt.storage, stmt.slot, ast.Store())], ast.Constant(None)))
+        if stmt.initializer is not None:
+            target = self._variable(stmt.storage, stmt.slot, ast.Store())
+            stmts.append(ast.Assign([target], self._expression(stmt.initializer)))
+        return stmts
+
+    def visit_while_stmt(self, stmt: st.While) -> List[ast.stmt]:
+        test = self._truthy(self._expression(stmt.condition), self._temporary())
+        body = self._block([stmt.body])
+        if stmt.increment is not None:
+            body.extend(self._discard(stmt.increment))
+        return [ast.While(test, body, [])]
+
+    _BINARY_HELPERS = {
+        TokenType.GREATER:       '_greater',
+        TokenType.GREATER_EQUAL: '_greater_eq',
+        TokenType.LESS:          '_less',
+        TokenType.LESS_EQUAL:    '_less_eq',
+        TokenType.MINUS:         '_minus',
+        TokenType.PLUS:          '_plus',
+        TokenType.SLASH:         '_slash',
+        TokenType.STAR:          '_star'
+    }
+
+    def _compile(self, definition: ast.FunctionDef, filename: str) -> Callable[..., Any]:
+        module = ast.fix_missing_locations(ast.Module(body=[definition], type_ignores=[]))
+        exec(compile(module, filename, 'exec'), self._namespace)
+        return self._namespace[definition.name]
+
+    def _variable(self, storage: Storage, slot: int, ctx: ast.expr_context) -> ast.expr:
+        if not self._in_frame:
+            if storage is not Storage.LOCAL:
+                raise _Unsupported()
+            return ast.Name(_local(slot), ctx)
+        if storage is Storage.LOCAL:
+            return ast.Subscript(ast.Name('_locals', ast.Load()), ast.Constant(slot), ctx)
+        return ast.Attribute(self._cell(storage, slot), 'value', ctx)
+
+    def _cell(self, storage: Storage, slot: int) -> ast.expr:
+        cells = '_locals' if storage is Storage.CELL else '_upvalues'
+        return ast.Subscript(ast.Name(cells, ast.Load()), ast.Constant(slot), ast.Load())
+
+    def _block(self, stmts: List[st.Stmt]) -> List[ast.stmt]:
+        body = []
+        for stmt in stmts:
+            body.extend(stmt.accept(self))
+        return body or [ast.Pass()]
+
+    def _discard(self, expr: ex.Expr) -> List[ast.stmt]:
+        if isinstance(expr, ex.Assign) and expr.storage is not None:
+            # the value of the assignment is discarded, so it can be a statement
+            target = self._variable(expr.storage, expr.slot, ast.Store())
+            return [ast.Assign([target], self._expression(expr.value))]
+        return [ast.Expr(self._expression(expr))]
+
+    def _expression(self, expr: ex.Expr) -> ast.expr:
+        return expr.accept(self)
+
+    def _globals(self) -> ast.expr:
+        return ast.Name('_globals', ast.Load())
+
+    def _helper(self, name: str, *args: ast.expr) -> ast.expr:
+        return ast.Call(ast.Name(name, ast.Load()), list(args), [])
+
+    def _token(self, token: Token) -> ast.expr:
+        # tokens are only needed to report runtime errors, so they are passed in as globals
+        name = f'_token_{len(self._namespace)}'
+        self._namespace[name] = token
+        return ast.Name(name, ast.Load())
+
+    def _temporary(self) -> str:
+        self._temporaries += 1
+        return f'_t{self._temporaries}'
+
+    @staticmethod
+    def _truthy(value: ast.expr, temporary: str) -> ast.expr:
+        # value is not None and value is not False, without evaluating it twice
+        return ast.BoolOp(ast.And(), [
+            ast.Compare(ast.NamedExpr(ast.Name(temporary, ast.Store()), value), [ast.IsNot()], [ast.Constant(None)]),
+            ast.Compare(ast.Name(temporary, ast.Load()), [ast.IsNot()], [ast.Constant(False)])
+        ])
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _local(slot: int) -> str:
+    return f'_s{slot}'
+
+
+def _call(interpreter: interpret.Interpreter, callee: LoxValue, arguments: Sequence[LoxValue], paren: Token) -> LoxValue:
+    if not isinstance(callee, LoxCallable):
+        raise RuntimeException(paren, 'Can only call functions and classes.')
+    if len(arguments) != callee.arity:
+        raise RuntimeException(paren, f'Expected {callee.arity} arguments, but got {len(arguments)}.')
+    return callee.call(interpreter, arguments)
+
+
+def _get_global(globals_: Dict[str, LoxValue], name: str, token: Token) -> LoxValue:
+    if name not in globals_:
+        raise RuntimeException(token, f"Undefined variable '{name}'.")
+    return globals_[name]
+
+
+def _set_global(globals_: Dict[str, LoxValue], name: str, value: LoxValue, token: Token) -> LoxValue:
+    if name not in globals_:
+        raise RuntimeException(token, f"Undefined variable '{name}'")
+    globals_[name] = value
+    return value
+
+
+def _set_item(values: List[LoxValue], index: int, value: LoxValue) -> LoxValue:
+    values[index] = value
+    return value
+
+
+def _set_value(cell: Cell, value: LoxValue) -> LoxValue:
+    cell.value = value
+    return value
+
+
+def _super(superclass: LoxClass, obj: LoxInstance, method: Token) -> LoxValue:
+    function = superclass.find_method(method.lexeme)
+    if function is None:
+        raise RuntimeException(method, f"Undefined property '{method.lexeme}'.")
+    return function.bind(obj)
+
+
+def _get(obj: LoxValue, name: Token) -> LoxValue:
+    if isinstance(obj, LoxInstance):
+        return obj.get(name)
+    raise RuntimeException(name, 'Only instances have properties')
+
+
+def _instance(obj: LoxValue, name: Token) -> LoxInstance:
+    if not isinstance(obj, LoxInstance):
+        raise RuntimeException(name, 'Only instances have fields.')
+    return obj
+
+
+def _set(obj: LoxInstance, name: Token, value: LoxValue) -> LoxValue:
+    obj.set(name, value)
+    return value
+
+
+def _negate(right: LoxValue, operator: Token) -> float:
+    if type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    return -right
+
+
+def _plus(left: LoxValue, right: LoxValue, operator: Token) -> LoxValue:
+    if type(left) is float and type(right) is float:
+        return left + right
+    if isinstance(left, str) or isinstance(right, str):
+        return stringify(left) + stringify(right)
+    raise RuntimeException(operator, 'Incompatible operands.')
+
+
+def _minus(left: LoxValue, right: LoxValue, operator: Token) -> float:
+    if type(left) is not float or type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    return left - right
+
+
+def _star(left: LoxValue, right: LoxValue, operator: Token) -> float:
+    if type(left) is not float or type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    return left * right
+
+
+def _slash(left: LoxValue, right: LoxValue, operator: Token) -> float:
+    if type(left) is not float or type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    if right == 0:
+        raise RuntimeException(operator, 'Division by zero.')
+    return left / right
+
+
+def _greater(left: LoxValue, right: LoxValue, operator: Token) -> bool:
+    if type(left) is not float or type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    return left > right
+
+
+def _greater_equal(left: LoxValue, right: LoxValue, operator: Token) -> bool:
+    if type(left) is not float or type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    return left >= right
+
+
+def _less(left: LoxValue, right: LoxValue, operator: Token) -> bool:
+    if type(left) is not float or type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    return left < right
+
+
+def _less_equal(left: LoxValue, right: LoxValue, operator: Token) -> bool:
+    if type(left) is not float or type(right) is not float:
+        raise RuntimeException(operator, 'Operands must be numbers.')
+    return left <= right
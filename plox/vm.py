@@ -0,0 +1,319 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+import lox
+import natives
+from bytecode import OpCode
+from callable import LoxCallable
+from classes import LoxClass, LoxInstance
+from compiler import Compiler
+from exceptions import RuntimeException
+from runtime import stringify
+
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Sequence, Tuple
+    from bytecode import Code
+    import stmt as st
+    from type import LoxValue
+
+
+# enum attribute lookups are slow, so the dispatch loop compares opcodes
+# against module level aliases of the members instead
+_CONSTANT = OpCode.CONSTANT
+_POP = OpCode.POP
+_GET_LOCAL = OpCode.GET_LOCAL
+_SET_LOCAL = OpCode.SET_LOCAL
+_GET_UPVALUE = OpCode.GET_UPVALUE
+_SET_UPVALUE = OpCode.SET_UPVALUE
+_GET_GLOBAL = OpCode.GET_GLOBAL
+_SET_GLOBAL = OpCode.SET_GLOBAL
+_DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL
+_GET_PROPERTY = OpCode.GET_PROPERTY
+_SET_PROPERTY = OpCode.SET_PROPERTY
+_GET_SUPER = OpCode.GET_SUPER
+_EQUAL = OpCode.EQUAL
+_NOT_EQUAL = OpCode.NOT_EQUAL
+_GREATER = OpCode.GREATER
+_GREATER_EQUAL = OpCode.GREATER_EQUAL
+_LESS = OpCode.LESS
+_LESS_EQUAL = OpCode.LESS_EQUAL
+_ADD = OpCode.ADD
+_SUBTRACT = OpCode.SUBTRACT
+_MULTIPLY = OpCode.MULTIPLY
+_DIVIDE = OpCode.DIVIDE
+_NOT = OpCode.NOT
+_NEGATE = OpCode.NEGATE
+_JUMP = OpCode.JUMP
+_JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE
+_JUMP_IF_TRUE = OpCode.JUMP_IF_TRUE
+_CALL = OpCode.CALL
+_CLOSURE = OpCode.CLOSURE
+_CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE
+_RETURN = OpCode.RETURN
+_CLASS = OpCode.CLASS
+_SUBCLASS = OpCode.SUBCLASS
+_METHOD = OpCode.METHOD
+_POP_JUMP_IF_FALSE = OpCode.POP_JUMP_IF_FALSE
+_SET_LOCAL_POP = OpCode.SET_LOCAL_POP
+
+# deepest chain of calls between closures before the program is stopped
+_FRAMES_MAX = 100000
+
+
+class VM:
+    def __init__(self):
+        self._globals: Dict[str, LoxValue] = {
+            'clock': natives.Clock(),
+            'print': natives.Print(),
+            'println': natives.PrintLn()
+        }
+
+    def interpret(self, stmts: List[st.Stmt]) -> None:
+        script = LoxClosure(Compiler().compile(stmts), (), None)
+        try:
+            self.run(script, [])
+        except RuntimeException as e:
+            lox.Lox.error_runtime(e)
+
+    def reserve(self, slots: int) -> None:
+        # the compiler resolves variables to stack slots and upvalues itself
+        pass
+
+    def run(self, closure: LoxClosure, arguments: Sequence[LoxValue]) -> LoxValue:
+        code = closure.code
+        instructions = code.instructions
+        upvalues = closure.upvalues
+        stack = [closure.receiver, *arguments]
+        open_upvalues: Optional[Dict[int, Upvalue]] = None
+        pc = 0
+        # state of the suspended callers, calls between closures don't recurse in Python
+        # so the depth of Lox recursion isn't bound by the interpreter's recursion limit
+        frames: List[Tuple[Code, List[Tuple[OpCode, object]], Tuple[Upvalue, ...], List[LoxValue],
+                           Optional[Dict[int, Upvalue]], int]] = []
+
+        while True:
+            op, arg = instructions[pc]
+            pc += 1
+
+            if op is _GET_LOCAL:
+                stack.append(stack[arg])
+            elif op is _CONSTANT:
+                stack.append(arg)
+            elif op is _GET_GLOBAL:
+                try:
+                    stack.append(self._globals[arg])
+                except KeyError:
+                    raise RuntimeException(code.tokens[pc - 1], f"Undefined variable '{arg}'.")
+            elif op is _POP_JUMP_IF_FALSE:
+                value = stack.pop()
+                if value is None or value is False:
+                    pc = arg
+            elif op is _SET_LOCAL_POP:
+                stack[arg] = stack.pop()
+            elif op is _JUMP:
+                pc = arg
+            elif op is _POP:
+                stack.pop()
+            elif op is _SET_LOCAL:
+                stack[arg] = stack[-1]
+            elif op is _JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    pc = arg
+            elif op is _ADD:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left + right
+                elif isinstance(left, str) or isinstance(right, str):
+                    stack[-1] = stringify(left) + stringify(right)
+                else:
+                    raise RuntimeException(code.tokens[pc - 1], 'Incompatible operands.')
+            elif op is _SUBTRACT:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                stack[-1] = left - right
+            elif op is _LESS:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                stack[-1] = left < right
+            elif op is _CALL:
+                callee = stack[-arg - 1]
+                call_arguments = stack[len(stack) - arg:]
+                del stack[-arg - 1:]
+                if type(callee) is LoxClosure:
+                    if arg != callee.code.arity:
+                        raise RuntimeException(
+                            code.tokens[pc - 1], f'Expected {callee.code.arity} arguments, but got {arg}.')
+                    if len(frames) == _FRAMES_MAX:
+                        raise RuntimeException(code.tokens[pc - 1], 'Stack overflow.')
+                    frames.append((code, instructions, upvalues, stack, open_upvalues, pc))
+                    code = callee.code
+                    instructions = code.instructions
+                    upvalues = callee.upvalues
+                    call_arguments.insert(0, callee.receiver)
+                    stack = call_arguments
+                    open_upvalues = None
+                    pc = 0
+                    continue
+                if not isinstance(callee, LoxCallable):
+                    raise RuntimeException(code.tokens[pc - 1], 'Can only call functions and classes.')
+                if arg != callee.arity:
+                    raise RuntimeException(code.tokens[pc - 1], f'Expected {callee.arity} arguments, but got {arg}.')
+                stack.append(callee.call(self, call_arguments))
+            elif op is _RETURN:
+                if open_upvalues is not None:
+                    for upvalue in open_upvalues.values():
+                        upvalue.close()
+                if not frames:
+                    return stack.pop()
+                value = stack.pop()
+                code, instructions, upvalues, stack, open_upvalues, pc = frames.pop()
+                stack.append(value)
+            elif op is _GET_UPVALUE:
+                upvalue = upvalues[arg]
+                stack.append(upvalue.cells[upvalue.index])
+            elif op is _SET_UPVALUE:
+                upvalue = upvalues[arg]
+                upvalue.cells[upvalue.index] = stack[-1]
+            elif op is _GET_PROPERTY:
+                obj = stack[-1]
+                if not isinstance(obj, LoxInstance):
+                    raise RuntimeException(arg, 'Only instances have properties')
+                # fields are looked up here, only methods need the call
+                fields = obj.fields
+                stack[-1] = fields[arg.lexeme] if arg.lexeme in fields else obj.get(arg)
+            elif op is _SET_PROPERTY:
+                value = stack.pop()
+                obj = stack[-1]
+                if not isinstance(obj, LoxInstance):
+                    raise RuntimeException(arg, 'Only instances have fields.')
+                obj.fields[arg.lexeme] = value
+                stack[-1] = value
+            elif op is _MULTIPLY:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                stack[-1] = left * right
+            elif op is _DIVIDE:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                if right == 0:
+                    raise RuntimeException(code.tokens[pc - 1], 'Division by zero.')
+                stack[-1] = left / right
+            elif op is _LESS_EQUAL:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                stack[-1] = left <= right
+            elif op is _GREATER:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                stack[-1] = left > right
+            elif op is _GREATER_EQUAL:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                stack[-1] = left >= right
+            elif op is _EQUAL:
+                right = stack.pop()
+                stack[-1] = stack[-1] == right
+            elif op is _NOT_EQUAL:
+                right = stack.pop()
+                stack[-1] = not stack[-1] == right
+            elif op is _NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op is _NEGATE:
+                if type(stack[-1]) is not float:
+                    raise RuntimeException(code.tokens[pc - 1], 'Operands must be numbers.')
+                stack[-1] = -stack[-1]
+            elif op is _JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is not None and value is not False:
+                    pc = arg
+            elif op is _SET_GLOBAL:
+                if arg not in self._globals:
+                    raise RuntimeException(code.tokens[pc - 1], f"Undefined variable '{arg}'")
+                self._globals[arg] = stack[-1]
+            elif op is _DEFINE_GLOBAL:
+                self._globals[arg] = stack.pop()
+            elif op is _CLOSURE:
+                captured = []
+                for is_local, index in arg.upvalues:
+                    if not is_local:
+                        captured.append(upvalues[index])
+                        continue
+                    if open_upvalues is None:
+                        open_upvalues = {}
+                    upvalue = open_upvalues.get(index)
+                    if upvalue is None:
+                        upvalue = open_upvalues[index] = Upvalue(stack, index)
+                    captured.append(upvalue)
+                stack.append(LoxClosure(arg, tuple(captured), None))
+            elif op is _CLOSE_UPVALUE:
+                if open_upvalues is not None and arg in open_upvalues:
+                    open_upvalues.pop(arg).close()
+                stack.pop()
+            elif op is _GET_SUPER:
+                superclass = stack.pop()
+                method = superclass.find_method(arg.lexeme)
+                if method is None:
+                    raise RuntimeException(arg, f"Undefined property '{arg.lexeme}'.")
+                stack[-1] = method.bind(stack[-1])
+            elif op is _CLASS:
+                stack.append(LoxClass(arg, None, {}))
+            elif op is _SUBCLASS:
+                superclass = stack[-1]
+                if not isinstance(superclass, LoxClass):
+                    raise RuntimeException(code.tokens[pc - 1], 'Superclass must be a class.')
+                stack[-1] = LoxClass(arg, superclass, {})
+            elif op is _METHOD:
+                method = stack.pop()
+                stack[-1].methods[arg] = method
+            else:
+                # unreachable
+                raise RuntimeError('Unreachable code.')
+
+
+@dataclass(slots=True)
+class LoxClosure(LoxCallable):
+    code: Code
+    upvalues: Tuple[Upvalue, ...]
+    receiver: Optional[LoxInstance]
+
+    @property
+    def arity(self) -> int:
+        return self.code.arity
+
+    def __str__(self) -> str:
+        return f'<fn {self.code.name}>'
+
+    def call(self, interpreter: VM, arguments: Sequence[LoxValue]) -> LoxValue:
+        return interpreter.run(self, arguments)
+
+    def bind(self, instance: LoxInstance) -> LoxClosure:
+        return LoxClosure(self.code, self.upvalues, instance)
+
+
+@dataclass(slots=True)
+class Upvalue:
+    # an open upvalue points into the stack of the frame that owns the variable,
+    # closing it moves the value into a list of its own
+    cells: List[LoxValue]
+    index: int
+
+    def close(self) -> None:
+        self.cells = [self.cells[self.index]]
+        self.index = 0